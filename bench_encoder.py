@@ -0,0 +1,171 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import itertools
+import subprocess
+import tempfile
+from datetime import datetime
+
+import generatevideo
+from bench_subtitles import write_synthetic_srt
+
+# Synthetic short: 9:16 background like ytdwnld.sh produces, a tone for the voice track
+BACKGROUND_SOURCE = "testsrc2=size=1080x1920:rate=30"
+TONE_SOURCE = "sine=frequency=440:sample_rate=44100"
+FRAME_RATE = 30
+
+DEFAULT_PRESETS = ["ultrafast", "veryfast", "faster", "fast", "medium"]
+DEFAULT_CRFS = [18, 21, 23]
+
+SSIM_RE = re.compile(r"SSIM .*All:([\d.]+)")
+PSNR_RE = re.compile(r"PSNR .*average:([\d.]+|inf)")
+
+def run_ffmpeg(args):
+    subprocess.run(["ffmpeg", "-y", "-v", "error", *args], check=True)
+
+def build_fixture(work_dir, duration):
+    """Background clip, tone track and compiled subtitles for the synthetic short"""
+    background = os.path.join(work_dir, "background.mp4")
+    run_ffmpeg([
+        "-f", "lavfi", "-i", f"{BACKGROUND_SOURCE}:duration={duration}",
+        "-c:v", "libx264", "-qp", "0", "-preset", "ultrafast", background
+    ])
+
+    tone = os.path.join(work_dir, "tone.wav")
+    run_ffmpeg(["-f", "lavfi", "-i", f"{TONE_SOURCE}:duration={duration}", tone])
+
+    srt_path = os.path.join(work_dir, "fixture_subs.srt")
+    word_count = int(duration / 0.33)
+    write_synthetic_srt(srt_path, word_count)
+    subtitles = os.path.join(work_dir, "fixture.ass")
+    generatevideo.compile_ass_subtitles(
+        generatevideo.load_srt_word_timings(srt_path), subtitles, "DejaVu Sans"
+    )
+    return background, tone, subtitles
+
+def render(background, tone, subtitles, duration, output_args):
+    """The production filter graph, so subtitle burn-in cost is part of every measurement"""
+    run_ffmpeg([
+        "-i", background,
+        "-i", tone,
+        "-filter_complex", generatevideo.build_render_filter(subtitles, 1080),
+        "-map", "[outv]",
+        "-map", "1:a",
+        "-t", str(duration),
+        *output_args
+    ])
+
+def measure_quality(output_path, reference_path):
+    """SSIM and PSNR of an encode against the lossless reference"""
+    result = subprocess.run(
+        [
+            "ffmpeg", "-i", output_path, "-i", reference_path,
+            "-lavfi", "[0:v]split[a0][a1];[1:v]split[b0][b1];[a0][b0]ssim;[a1][b1]psnr",
+            "-f", "null", "-"
+        ],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    ssim = SSIM_RE.search(result.stderr)
+    psnr = PSNR_RE.search(result.stderr)
+    return (
+        float(ssim.group(1)) if ssim else None,
+        float(psnr.group(1)) if psnr else None
+    )
+
+def recommend(results, min_ssim):
+    """Fastest configuration meeting the quality floor, smaller output breaking ties"""
+    acceptable = [r for r in results if r["ssim"] is not None and r["ssim"] >= min_ssim]
+    if not acceptable:
+        return None
+    return max(acceptable, key=lambda r: (round(r["fps"], 1), -r["size_bytes"]))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark x264 presets/CRF/threads and write a recommended encoder profile")
+    parser.add_argument("--duration", type=float, default=10.0, help="Length of the synthetic short in seconds")
+    parser.add_argument("--presets", nargs="+", default=DEFAULT_PRESETS)
+    parser.add_argument("--crf", nargs="+", type=int, default=DEFAULT_CRFS)
+    parser.add_argument("--threads", nargs="+", type=int, default=[0, max(1, (os.cpu_count() or 2) // 2)],
+                        help="Thread counts to try (0 = x264 default)")
+    parser.add_argument("--min-ssim", type=float, default=0.97, help="Quality floor for the recommendation")
+    parser.add_argument("--output", default=generatevideo.ENCODER_PROFILE_FILE, help="Where to write the profile")
+    parser.add_argument("--dry-run", action="store_true", help="Print results without writing the profile")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not shutil.which("ffmpeg"):
+        print("ffmpeg not found")
+        return 1
+
+    work_dir = tempfile.mkdtemp(prefix="bench_encoder_")
+    try:
+        print(f"Building {args.duration:.0f}s synthetic short in {work_dir}")
+        background, tone, subtitles = build_fixture(work_dir, args.duration)
+
+        reference = os.path.join(work_dir, "reference.mkv")
+        render(background, tone, subtitles, args.duration,
+               ["-c:v", "libx264", "-qp", "0", "-preset", "ultrafast", "-c:a", "copy", reference])
+
+        frames = args.duration * FRAME_RATE
+        results = []
+        print(f"\n{'preset':<10}{'crf':>5}{'threads':>9}{'fps':>9}{'size KB':>10}{'ssim':>8}{'psnr':>8}")
+        for preset, crf, threads in itertools.product(args.presets, args.crf, args.threads):
+            encoder = dict(generatevideo.ENCODER_SETTINGS, preset=preset, crf=crf, threads=threads)
+            output_path = os.path.join(work_dir, f"{preset}_{crf}_{threads}.mp4")
+
+            started = time.perf_counter()
+            render(background, tone, subtitles, args.duration,
+                   [*generatevideo.build_encode_args(encoder), output_path])
+            elapsed = time.perf_counter() - started
+
+            ssim, psnr = measure_quality(output_path, reference)
+            result = {
+                "preset": preset,
+                "crf": crf,
+                "threads": threads,
+                "fps": frames / elapsed,
+                "size_bytes": os.path.getsize(output_path),
+                "ssim": ssim,
+                "psnr": psnr,
+            }
+            results.append(result)
+            os.remove(output_path)
+            print(f"{preset:<10}{crf:>5}{threads:>9}{result['fps']:>9.1f}{result['size_bytes'] / 1024:>10.0f}"
+                  f"{ssim or 0:>8.4f}{psnr or 0:>8.2f}")
+
+        best = recommend(results, args.min_ssim)
+        if best is None:
+            print(f"\nNo configuration reached SSIM {args.min_ssim}; profile not written")
+            return 1
+
+        profile = {
+            "preset": best["preset"],
+            "crf": best["crf"],
+            "threads": best["threads"],
+            "measured": best,
+            "min_ssim": args.min_ssim,
+            "host": socket.gethostname(),
+            "cpu_count": os.cpu_count(),
+            "benchmarked_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "grid": results,
+        }
+        print(f"\nRecommended: preset={best['preset']} crf={best['crf']} threads={best['threads']} "
+              f"({best['fps']:.1f} fps, SSIM {best['ssim']:.4f})")
+
+        if not args.dry_run:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(profile, f, indent=1)
+            print(f"Encoder profile written to {args.output}")
+        return 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+import io
+import os
+import re
+import sys
+import json
+import math
+import time
+import shutil
+import random
+import argparse
+import resource
+import subprocess
+import tempfile
+import contextlib
+import types
+
+# Whole-pipeline throughput benchmark on one offline box. Every external
+# service is replaced by a local stand-in:
+#   Reddit   -> FakeReddit producing synthetic stories
+#   OpenAI   -> StubLLM returning the input text
+#   Edge TTS -> StubCommunicate streaming silent mp3 with synthetic WordBoundary timings
+# praw and edge_tts are replaced in sys.modules, so neither needs to be installed.
+#   Backgrounds -> lavfi testsrc2 clip
+#   YouTube  -> upload_stub resumable-upload server
+# The real stage code runs unchanged: fetch_and_save_stories, ttsbot.main,
+# generatevideo.main (create_short_video) and upload_video.
+
+BENCH_SUBREDDIT = "BenchStories"
+WORDS = ("the", "night", "shift", "manager", "told", "me", "that", "customers", "always", "lie", "about", "receipts")
+WORD_SECONDS = 0.3  # Roughly Edge TTS at TTS_RATE "+50%"
+BACKGROUND_SECONDS = 30
+BYTES_PER_BLOCK = 512  # getrusage block unit
+
+class FakePost:
+    def __init__(self, index, word_count):
+        rng = random.Random(index)
+        self.id = f"bench{index}"
+        self.title = f"Bench story number {index}"
+        self.selftext = " ".join(rng.choice(WORDS) for _ in range(word_count))
+        self.score = 5000 + index
+        self.num_comments = 500
+        self.stickied = False
+        self.created_utc = 1700000000 + index
+        self.author = "bench_author"
+        self.link_flair_text = None
+        self.url = f"https://example.invalid/{self.id}"
+        self.comments = []
+
+class FakeSubreddit:
+    def __init__(self, count, word_count):
+        self.count = count
+        self.word_count = word_count
+
+    def top(self, time_filter=None, limit=None):
+        for i in range(self.count):
+            yield FakePost(i, self.word_count)
+
+class FakeUser:
+    def me(self):
+        return "bench_user"
+
+class FakeReddit:
+    def __init__(self, count, word_count):
+        self.user = FakeUser()
+        self._subreddit = FakeSubreddit(count, word_count)
+
+    def subreddit(self, name):
+        return self._subreddit
+
+class _Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class StubLLM:
+    """OpenAI client stand-in: echoes the text after the prompt"""
+    def __init__(self):
+        self.chat = _Namespace(completions=_Namespace(create=self._create))
+
+    def _create(self, messages, **kwargs):
+        text = messages[-1]["content"].split("\n\n", 1)[-1]
+        return _Namespace(choices=[_Namespace(message=_Namespace(content=text))])
+
+def make_silent_mp3(path):
+    """One second of CBR silence; whole seconds are made by repeating its frames"""
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", "anullsrc=r=24000:cl=mono", "-t", "1",
+        "-c:a", "libmp3lame", "-b:a", "48k", "-write_xing", "0", "-id3v2_version", "0",
+        path
+    ], check=True)
+    with open(path, "rb") as f:
+        return f.read()
+
+def make_stub_communicate(silence):
+    class StubCommunicate:
+        """edge_tts.Communicate stand-in with the same stream() chunk format"""
+        def __init__(self, text, voice, rate=None):
+            self.words = text.split()
+
+        async def stream(self):
+            seconds = max(1, math.ceil(len(self.words) * WORD_SECONDS))
+            yield {"type": "audio", "data": silence * seconds}
+            for i, word in enumerate(self.words):
+                yield {
+                    "type": "WordBoundary",
+                    "offset": int(i * WORD_SECONDS * 10_000_000),
+                    "duration": int(WORD_SECONDS * 0.9 * 10_000_000),
+                    "text": word,
+                }
+    return StubCommunicate
+
+def install_stub_modules(reddit, communicate):
+    """
+    Stand-in praw and edge_tts modules for the stages' lazy imports. Installed even
+    when the real packages are present, so a run never reaches Reddit or Edge TTS.
+    """
+    class PRAWException(Exception):
+        pass
+
+    praw = types.ModuleType("praw")
+    praw.Reddit = lambda **kwargs: reddit
+    praw.exceptions = types.ModuleType("praw.exceptions")
+    praw.exceptions.PRAWException = PRAWException
+    edge_tts = types.ModuleType("edge_tts")
+    edge_tts.Communicate = communicate
+    sys.modules.update({"praw": praw, "praw.exceptions": praw.exceptions, "edge_tts": edge_tts})
+
+def reset_peak_rss():
+    """Reset this process's peak RSS (Linux); False where only the lifetime peak is available"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def read_peak_rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            return int(re.search(r"VmHWM:\s+(\d+)", f.read()).group(1))
+    except (OSError, AttributeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def read_proc_io():
+    """Bytes this process actually read from / wrote to storage"""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["read_bytes"]), int(fields["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+def snapshot():
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    read_bytes, write_bytes = read_proc_io()
+    return {
+        "time": time.perf_counter(),
+        "rss_kb": read_peak_rss_kb(),
+        "child_rss_kb": children.ru_maxrss,  # Largest child reaped so far; the kernel never resets it
+        "read_bytes": read_bytes + children.ru_inblock * BYTES_PER_BLOCK,
+        "write_bytes": write_bytes + children.ru_oublock * BYTES_PER_BLOCK,
+    }
+
+def run_stage(name, func, count_items, verbose):
+    per_stage = reset_peak_rss()
+    before = snapshot()
+    output = io.StringIO()
+    with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(output):
+        func()
+    after = snapshot()
+    seconds = after["time"] - before["time"]
+    items = count_items()
+    return {
+        "stage": name,
+        "items": items,
+        "seconds": seconds,
+        "items_per_second": items / seconds if seconds else 0.0,
+        "peak_rss_mb": after["rss_kb"] / 1024,
+        "peak_rss_scope": "stage" if per_stage else "cumulative",
+        "peak_child_rss_mb_cumulative": after["child_rss_kb"] / 1024,
+        "read_mb": (after["read_bytes"] - before["read_bytes"]) / 2**20,
+        "write_mb": (after["write_bytes"] - before["write_bytes"]) / 2**20,
+    }
+
+def compare(results, baseline_path, tolerance):
+    """Stages whose throughput fell more than tolerance below the baseline"""
+    with open(baseline_path) as f:
+        baseline = {r["stage"]: r for r in json.load(f)["stages"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["stage"])
+        if previous and previous["items_per_second"]:
+            change = result["items_per_second"] / previous["items_per_second"] - 1
+            if change < -tolerance:
+                regressions.append((result["stage"], change))
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end throughput benchmark of the whole pipeline")
+    parser.add_argument("--stories", type=int, default=10)
+    parser.add_argument("--words", type=int, default=250, help="Words per synthetic story")
+    parser.add_argument("--upload-fail-rate", type=float, default=0.0, help="503 rate injected by the stub upload server")
+    parser.add_argument("--json", default=None, help="Write results to this file")
+    parser.add_argument("--compare", default=None, help="Baseline results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed throughput drop versus the baseline")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    parser.add_argument("--verbose", action="store_true", help="Show the stages' own output")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not shutil.which("ffmpeg"):
+        print("ffmpeg not found")
+        return 1
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    json_path = os.path.abspath(args.json) if args.json else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    sys.path.insert(0, repo_dir)
+    os.chdir(work_dir)  # Every stage uses paths relative to the working directory
+
+    import upload_stub
+    server = upload_stub.start_stub_server(fail_rate=args.upload_fail_rate, seed=1)
+    os.environ["YOUTUBE_UPLOAD_ENDPOINT"] = server.endpoint
+    os.environ["BOT_METRICS_DIR"] = os.path.join(work_dir, "metrics")
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+    try:
+        import redditbot
+        import ttsbot
+        import generatevideo
+        import youtubeupload
+
+        install_stub_modules(
+            FakeReddit(args.stories, args.words),
+            make_stub_communicate(make_silent_mp3(os.path.join(work_dir, "silence.mp3")))
+        )
+        redditbot.SUBREDDITS = [BENCH_SUBREDDIT]
+        ttsbot.client = StubLLM()
+        youtubeupload.UPLOAD_BACKOFF_BASE = 0.05
+
+        os.makedirs(generatevideo.PROCESSED_VIDEOS_DIR, exist_ok=True)
+        subprocess.run([
+            "ffmpeg", "-y", "-v", "error",
+            "-f", "lavfi", "-i", f"testsrc2=size=1080x1920:rate=30:duration={BACKGROUND_SECONDS}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-crf", "23",
+            os.path.join(generatevideo.PROCESSED_VIDEOS_DIR, "bench_background.mp4")
+        ], check=True)
+
+        def upload_all():
+            for video in sorted(youtubeupload.get_uploadable_videos()):
+                youtubeupload.upload_video(None, os.path.join(youtubeupload.VIDEOS_FOLDER, video),
+                                           youtubeupload.extract_title(video))
+                youtubeupload.log_uploaded_video(video)
+
+        def count(directory, suffix):
+            return lambda: sum(1 for f in os.listdir(directory) if f.endswith(suffix))
+
+        def count_uploaded():
+            with open(youtubeupload.UPLOAD_LOG_FILE) as f:
+                return sum(1 for _ in f)
+
+        started = time.perf_counter()
+        results = [
+            run_stage("scrape", redditbot.fetch_and_save_stories,
+                      count(redditbot.OUTPUT_DIR, ".txt"), args.verbose),
+            run_stage("tts", ttsbot.main,
+                      count(ttsbot.OUTPUT_DIR, "_tts.mp3"), args.verbose),
+            run_stage("render", lambda: generatevideo.main([]),
+                      count(generatevideo.OUTPUT_DIR, "_short.mp4"), args.verbose),
+            run_stage("upload", upload_all, count_uploaded, args.verbose),
+        ]
+        total_seconds = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        os.chdir(repo_dir)
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{args.stories} stories x {args.words} words, upload fail rate {args.upload_fail_rate}\n")
+    per_stage_rss = all(r["peak_rss_scope"] == "stage" for r in results)
+    rss_header = "peak RSS MB" if per_stage_rss else "peak RSS MB*"
+    print(f"{'stage':<8}{'items':>7}{'seconds':>10}{'items/s':>10}{rss_header:>13}"
+          f"{'child RSS MB*':>14}{'read MB':>10}{'write MB':>10}")
+    for r in results:
+        print(f"{r['stage']:<8}{r['items']:>7}{r['seconds']:>10.2f}{r['items_per_second']:>10.2f}"
+              f"{r['peak_rss_mb']:>13.1f}{r['peak_child_rss_mb_cumulative']:>14.1f}{r['read_mb']:>10.1f}{r['write_mb']:>10.1f}")
+    cumulative = "child RSS" if per_stage_rss else "peak RSS and child RSS"
+    print(f"* {cumulative}: peak since the benchmark started, not per stage")
+    end_to_end = results[-1]["items"] / total_seconds if total_seconds else 0.0
+    print(f"\nEnd to end: {total_seconds:.2f}s, {end_to_end:.3f} stories/s, upload stub {server.stats}")
+    if args.keep:
+        print(f"Scratch directory kept: {work_dir}")
+
+    report = {
+        "stories": args.stories,
+        "words": args.words,
+        "end_to_end_seconds": total_seconds,
+        "end_to_end_stories_per_second": end_to_end,
+        "stages": results,
+    }
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=1)
+
+    if compare_path:
+        regressions = compare(results, compare_path, args.tolerance)
+        for stage, change in regressions:
+            print(f"REGRESSION: {stage} throughput {change:+.0%} versus baseline")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
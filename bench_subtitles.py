@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+
+import generatevideo
+
+# Synthetic story: ~3 words per second, like Edge TTS at TTS_RATE "+50%"
+WORD_DURATION = 0.28
+WORD_GAP = 0.05
+RENDER_SIZE = "608x1080"
+RENDER_FPS = 30
+
+def write_synthetic_srt(path, word_count):
+    """Write an SRT the way ttsbot does: one WordBoundary per block"""
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+    with open(path, 'w', encoding='utf-8') as f:
+        t = 0.0
+        for i in range(word_count):
+            start = datetime.min + timedelta(seconds=t)
+            end = datetime.min + timedelta(seconds=t + WORD_DURATION)
+            f.write(f"{i + 1}\n{start.strftime('%H:%M:%S,%f')[:-3]} --> {end.strftime('%H:%M:%S,%f')[:-3]}\n")
+            f.write(f"{words[i % len(words)]}\n\n")
+            t += WORD_DURATION + WORD_GAP
+    return t
+
+def legacy_preprocess_srt(srt_path, out_path):
+    """The old preprocess_srt hot loop: strptime/timedelta per block, rewritten as SRT"""
+    with open(srt_path, 'r', encoding='utf-8') as infile, \
+         open(out_path, 'w', encoding='utf-8') as outfile:
+        block = []
+        number = 1
+        for line in list(infile) + ['']:
+            line = line.strip()
+            if line:
+                block.append(line)
+                continue
+            if len(block) < 3:
+                block = []
+                continue
+            start, end = block[1].split(' --> ')
+            start_time = datetime.strptime(start.strip(), "%H:%M:%S,%f")
+            end_time = datetime.strptime(end.strip(), "%H:%M:%S,%f")
+            words = block[2].split()
+            word_duration = (end_time - start_time).total_seconds() / len(words)
+            for i, word in enumerate(words):
+                word_start = start_time + timedelta(seconds=i * word_duration)
+                word_end = start_time + timedelta(seconds=(i + 1) * word_duration)
+                outfile.write(f"{number}\n")
+                outfile.write(
+                    f"{word_start.strftime('%H:%M:%S,%f')[:-3]} --> "
+                    f"{word_end.strftime('%H:%M:%S,%f')[:-3]}\n"
+                )
+                outfile.write(f"{word}\n\n")
+                number += 1
+            block = []
+
+def legacy_force_style(font_name):
+    """The force_style string the old render path handed to libass"""
+    return (
+        f"FontName={font_name},"
+        f"FontSize={generatevideo.STYLE_CONFIG['font_size']},"
+        f"PrimaryColour=&H00FFFFFF,"
+        f"Bold=1,"
+        f"OutlineColour=&H00000000,"
+        f"Outline={generatevideo.STYLE_CONFIG['outline_width']},"
+        f"Alignment=2,"
+        f"MarginV=100,"
+        f"MarginH=20,"
+        f"BorderStyle=3,"
+        f"BackColour=&H80000000"
+    )
+
+def time_compile(func, repeats):
+    """Best-of-N wall time of func() in milliseconds"""
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def render_fps(subtitle_filter, duration):
+    """Burn subtitles onto a lavfi background into the null muxer and report fps"""
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"color=c=gray:s={RENDER_SIZE}:r={RENDER_FPS}:d={duration:.2f}",
+        "-vf", f"{subtitle_filter},format=yuv420p",
+        "-c:v", "libx264", "-crf", "18", "-preset", "fast",
+        "-f", "null", "-"
+    ]
+    started = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    elapsed = time.perf_counter() - started
+    return duration * RENDER_FPS / elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ASS subtitle compiler against the old SRT + force_style path")
+    parser.add_argument("--words", type=int, default=400, help="Words in the synthetic story")
+    parser.add_argument("--repeats", type=int, default=5, help="Compile repetitions (best is reported)")
+    parser.add_argument("--group", type=int, nargs="+", default=[1, 2, 3], help="words_per_event values to try")
+    parser.add_argument("--no-render", action="store_true", help="Only measure compile time")
+    args = parser.parse_args(argv)
+
+    font_name = "Impact"
+    work_dir = tempfile.mkdtemp(prefix="bench_subs_")
+    try:
+        srt_path = os.path.join(work_dir, "story_subs.srt")
+        duration = write_synthetic_srt(srt_path, args.words)
+        legacy_path = os.path.join(work_dir, "legacy.srt")
+
+        results = []
+        ms = time_compile(lambda: legacy_preprocess_srt(srt_path, legacy_path), args.repeats)
+        legacy_filter = f"subtitles='{legacy_path}':force_style='{legacy_force_style(font_name)}'"
+        results.append(("srt+force_style", args.words, ms, legacy_filter))
+
+        for group in args.group:
+            ass_path = os.path.join(work_dir, f"group{group}.ass")
+            events = []
+            ms = time_compile(
+                lambda: events.append(generatevideo.compile_ass_subtitles(
+                    generatevideo.load_srt_word_timings(srt_path), ass_path, font_name, words_per_event=group
+                )),
+                args.repeats
+            )
+            results.append((f"ass words_per_event={group}", events[-1], ms, f"subtitles='{ass_path}'"))
+
+        render = not args.no_render and shutil.which("ffmpeg")
+        if not args.no_render and not render:
+            print("ffmpeg not found, skipping render benchmark")
+
+        print(f"\n{args.words} words, {duration:.1f}s of speech\n")
+        print(f"{'path':<26}{'events':>8}{'compile ms':>12}{'render fps':>12}")
+        for name, events, ms, subtitle_filter in results:
+            fps = f"{render_fps(subtitle_filter, duration):.1f}" if render else "-"
+            print(f"{name:<26}{events:>8}{ms:>12.2f}{fps:>12}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import os
+import sys
+import time
+import argparse
+import importlib
+import subprocess
+from pathlib import Path
+
+import metrics
+
+# One entry point for every stage:
+#   python bot.py render --only 20240101_story   -> generatevideo.py --only 20240101_story
+#   python bot.py --plan                        -> pending work per stage, read from disk
+#   python bot.py --import-times                -> import cost per subcommand versus its budget
+# Stage modules are imported only when their subcommand runs, and their clients
+# (praw, OpenAI, Google) only when first used.
+
+# name: (module, entry function, entry takes argv, help)
+COMMANDS = {
+    "scrape": ("redditbot", "fetch_and_save_stories", False, "Scrape Reddit stories into stories/"),
+    "tts": ("ttsbot", "main", False, "Clean stories and generate TTS audio and subtitles"),
+    "render": ("generatevideo", "main", True, "Render shorts from cleaned stories"),
+    "upload": ("youtubeupload", "main", False, "Upload one video per slot to YouTube"),
+    "schedule": ("upload_scheduler", "main", True, "Multi-channel upload scheduler"),
+    "pipeline": ("pipeline", "main", True, "All stages as one streaming pipeline"),
+    "gc": ("storage", "main", True, "Collect consumed artifacts under the disk quota"),
+    "pacing": ("subtitle_pacing", "main", True, "Subtitle pacing statistics and paced SRTs for all stories"),
+    "bench-pipeline": ("bench_pipeline", "main", True, "Offline end-to-end throughput benchmark"),
+    "bench-encoder": ("bench_encoder", "main", True, "Encoder preset/crf/threads benchmark"),
+    "bench-subtitles": ("bench_subtitles", "main", True, "Subtitle compiler benchmark"),
+    "upload-stub": ("upload_stub", "main", True, "Local stand-in for the YouTube upload endpoint"),
+}
+
+# Milliseconds to import each subcommand's module in a fresh interpreter.
+# None of them may pull in praw, openai, edge_tts, pydub or the Google clients.
+IMPORT_BUDGET_MS = {
+    "scrape": 50,
+    "tts": 80,
+    "render": 80,
+    "upload": 80,
+    "schedule": 120,
+    "pipeline": 150,
+    "gc": 50,
+    "pacing": 250,  # numpy
+    "bench-pipeline": 50,
+    "bench-encoder": 100,
+    "bench-subtitles": 100,
+    "upload-stub": 120,  # http.server
+}
+IMPORT_RUNS = 3  # Best of N, to keep a cold disk cache out of the number
+PLAN_SHOW = 5  # Names listed per stage in --plan
+
+def run_command(name, argv):
+    module_name, entry_name, takes_args, help_text = COMMANDS[name]
+    if argv and not takes_args:
+        print(f"bot.py {name}: {help_text} (takes no options)")
+        return 0 if argv in (["-h"], ["--help"]) else 2
+
+    entry = getattr(importlib.import_module(module_name), entry_name)
+    return metrics.run_main(lambda: entry(argv) if takes_args else entry(), module_name)
+
+def pending_tts():
+    """Index rows whose cleaned text, audio or subtitles are missing"""
+    import ttsbot
+    if not os.path.exists(ttsbot.INDEX_FILE):
+        return []
+    with open(ttsbot.INDEX_FILE, 'r', encoding='utf-8') as f:
+        rows = [line.split('|', 1)[0] for line in f][1:]
+    import storage
+    pending = []
+    for filename in rows:
+        base_name = Path(filename).stem
+        if storage.is_collected(base_name):
+            continue
+        outputs = [f"{base_name}_cleaned.txt", f"{base_name}_tts.mp3", f"{base_name}_subs.srt"]
+        if not all(os.path.exists(os.path.join(ttsbot.OUTPUT_DIR, o)) for o in outputs):
+            pending.append(base_name)
+    return pending
+
+def pending_renders():
+    """
+    Story groups without an up-to-date render, judged from the manifest alone.
+    Changed audio/subtitle content is only detected by the render itself, which hashes inputs.
+    """
+    import generatevideo
+    if not os.path.isdir(generatevideo.CLEANED_STORIES_DIR):
+        return []
+    generatevideo.load_encoder_profile()
+    manifest = generatevideo.load_render_manifest()
+    uploaded = generatevideo.load_uploaded_videos()
+    config_hash = generatevideo.render_config_hash()
+
+    pending = []
+    for base_name in sorted(generatevideo.find_matching_files()):
+        output_name = f"{base_name}_short.mp4"
+        record = manifest.get(output_name)
+        if output_name in uploaded:
+            continue
+        if record is None:
+            pending.append(f"{base_name} (new)")
+        elif record.get("config") != config_hash:
+            pending.append(f"{base_name} (config changed)")
+        elif not os.path.exists(os.path.join(generatevideo.OUTPUT_DIR, output_name)):
+            pending.append(f"{base_name} (output missing)")
+    return pending
+
+def pending_uploads():
+    import youtubeupload
+    if not os.path.isdir(youtubeupload.VIDEOS_FOLDER):
+        return []
+    return sorted(youtubeupload.get_uploadable_videos())
+
+PLAN_STAGES = {
+    "tts": pending_tts,
+    "render": pending_renders,
+    "upload": pending_uploads,
+}
+
+def show_plan(stage=None):
+    """Dry run: list the work each stage would do next, without running anything"""
+    started = time.perf_counter()
+    for name, pending_func in PLAN_STAGES.items():
+        if stage not in (None, name):
+            continue
+        pending = pending_func()
+        print(f"{name}: {len(pending)} pending")
+        for item in pending[:PLAN_SHOW]:
+            print(f"  {item}")
+        if len(pending) > PLAN_SHOW:
+            print(f"  ... {len(pending) - PLAN_SHOW} more")
+    print(f"Plan built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+def measure_import_ms(module_name):
+    """Import time of one module in a fresh interpreter, best of IMPORT_RUNS"""
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"import {module_name}; "
+        "print((time.perf_counter() - started) * 1000)"
+    )
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(IMPORT_RUNS):
+        result = subprocess.run([sys.executable, "-c", code], cwd=script_dir, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        ms = float(result.stdout.strip().splitlines()[-1])
+        best = ms if best is None else min(best, ms)
+    return best
+
+def check_import_budget():
+    """Returns the number of subcommands over budget"""
+    over = 0
+    for name, (module_name, _, _, _) in COMMANDS.items():
+        budget = IMPORT_BUDGET_MS[name]
+        try:
+            ms = measure_import_ms(module_name)
+        except RuntimeError as e:
+            print(f"{name:<16}{module_name:<18} import failed: {e}")
+            over += 1
+            continue
+        status = "ok" if ms <= budget else "OVER"
+        over += ms > budget
+        print(f"{name:<16}{module_name:<18}{ms:>8.1f} ms / {budget} ms  {status}")
+    return over
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return run_command(argv[0], argv[1:])
+
+    parser = argparse.ArgumentParser(
+        description="Reddit stories to YouTube shorts",
+        epilog="commands:\n" + "\n".join(f"  {name:<16}{spec[3]}" for name, spec in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        usage="bot.py [--plan [STAGE] [--channels FILE] | --import-times] | bot.py COMMAND [options]"
+    )
+    parser.add_argument("--plan", nargs="?", const="all", choices=["all"] + list(PLAN_STAGES),
+                        help="List pending work per stage from the filesystem and exit")
+    parser.add_argument("--import-times", action="store_true",
+                        help="Measure each subcommand's import time against IMPORT_BUDGET_MS")
+    parser.add_argument("--channels", default=None,
+                        help="Channel definitions --plan reads upload logs from (default BOT_CHANNELS_FILE or channels.json)")
+    args = parser.parse_args(argv)
+
+    if args.channels:
+        import upload_scheduler
+        upload_scheduler.use_channels_file(args.channels)
+    if args.plan:
+        show_plan(None if args.plan == "all" else args.plan)
+        return 0
+    if args.import_times:
+        return 1 if check_import_budget() else 0
+    parser.print_help()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,21 +2,27 @@ import os
 import random
 import subprocess
 import re
-from pydub import AudioSegment
-from dotenv import load_dotenv
-import textwrap
-from datetime import datetime, timedelta
-
-# --- Load OpenAI API Key Securely ---
-load_dotenv()
+import json
+import hashlib
+import argparse
+import threading
+import mediacache
+import metrics
+import storage
 
 # Config
 CLEANED_STORIES_DIR = "./cleaned_stories"
 PROCESSED_VIDEOS_DIR = "./processed_videos"
 OUTPUT_DIR = "./videos"
 FONTS_DIR = "./fonts"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs(FONTS_DIR, exist_ok=True)
+BACKGROUND_CACHE_DIR = os.path.join(OUTPUT_DIR, "bg_cache")
+BACKGROUND_CACHE_QUOTA_MB = 4096  # Graded background variants, evicted LRU
+RENDER_MANIFEST_FILE = os.path.join(OUTPUT_DIR, "render_manifest.json")
+ENCODER_PROFILE_FILE = "./encoder_profile.json"  # Written by bench_encoder.py
+PREVIEW_DIR = "./previews"  # Outside videos/ so youtubeupload never sees previews
+PREVIEW_HEIGHT = 540
+CONTACT_SHEET_GRID = (4, 3)  # Columns x rows of sampled frames
+RENDER_REVISION = 2  # Bump when the render pipeline changes output for the same inputs
 
 # Style Configuration
 STYLE_CONFIG = {
@@ -26,12 +32,12 @@ STYLE_CONFIG = {
     "font_color": "white",
     "outline_color": "black",
     "outline_width": 2,
-    "background_opacity": 0.9,
+    "background_opacity": 0.5,
     "background_color": "black",
     "text_align": "center",
     "word_wrap": 24,
-    "margin_v": 300,
-    "margin_h": 50,
+    "margin_v": 100,  # Subtitle canvas units (see subtitle_play_res)
+    "margin_h": 20,
     "blur_strength": 0.1,
     "glow_effect": True,
     "glow_color": "0xFFFF00",
@@ -40,6 +46,9 @@ STYLE_CONFIG = {
     "shadow_color": "black",
     "shadow_strength": 0.6,
     "subtitles_duration_buffer": 0.2,
+    "subtitle_play_res": (384, 288),  # libass default SRT canvas, keeps font_size meaning the same
+    "words_per_event": 1,  # Words grouped into one subtitle event
+    "max_event_gap": 0.35,  # Never group words across a pause longer than this (seconds)
     "video_effects": {
         "blur": True,
         "saturation": 1.2,
@@ -48,250 +57,280 @@ STYLE_CONFIG = {
     }
 }
 
+SRT_TIME_RE = re.compile(r"(\d+):(\d{2}):(\d{2})[,.](\d{3})")
+ASS_COLOURS = {
+    "white": "FFFFFF",
+    "black": "000000",
+    "yellow": "FFFF00",
+    "red": "FF0000",
+}
+
+# Subtle final grade over the burned-in subtitles, applied in the same encode
+FINAL_ENHANCE_FILTER = "eq=saturation=1.05:contrast=1.02"
+
+# Encoder Configuration
+ENCODER_SETTINGS = {
+    "crf": 18,
+    "preset": "fast",
+    "profile": "high",
+    "level": "4.0",
+    "audio_bitrate": "192k",
+    "threads": 0,  # 0 lets x264 pick
+}
+
+# Draft renders trade quality for speed; layout is unchanged
+PREVIEW_ENCODER = dict(ENCODER_SETTINGS, crf=28, preset="ultrafast", profile="main", audio_bitrate="96k")
+
 def get_base_filename(filename):
     """Extract base filename without extension and suffix"""
     # Remove known suffixes and extension
-    for suffix in ['_tts', '_cleaned', '_subs', '.mp3', '.txt', '.srt']:
+    for suffix in ['_tts', '_cleaned', '_subs', '_paced', '.mp3', '.txt', '.srt']:
         filename = filename.replace(suffix, '')
     return filename
 
 def get_available_fonts():
-    """Check which fonts are available on the system with better verification"""
+    """Check which fonts are available, using the persistent font resolution cache"""
     available_fonts = []
     font_candidates = [STYLE_CONFIG["font_primary"]] + STYLE_CONFIG["font_fallback"]
     
     for font in font_candidates:
-        try:
-            # Check system fonts
-            result = subprocess.run(
-                ["fc-match", "-f", "%{file}\n", font],
-                capture_output=True,
-                text=True
-            )
-            
-            if result.returncode == 0 and os.path.exists(result.stdout.strip()):
-                available_fonts.append(font)
-                continue
-                
-            # Check local fonts directory
-            local_font = os.path.join(FONTS_DIR, f"{font}.ttf")
-            if os.path.exists(local_font):
-                available_fonts.append(f"'{local_font}'")  # Quoted path
-                
-        except Exception:
+        resolved = mediacache.resolve_font(font, FONTS_DIR)
+        if resolved is None:
             continue
+        kind, font_file = resolved
+        if kind == "system":
+            available_fonts.append(font)
+        else:
+            available_fonts.append(f"'{font_file}'")  # Quoted path
             
     return available_fonts if available_fonts else ["Arial"]
 
-def preprocess_srt(srt_path):
+def _parse_srt_time(value):
+    """Convert an SRT timecode (HH:MM:SS,mmm) to seconds"""
+    match = SRT_TIME_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Bad SRT timecode: {value!r}")
+    hours, minutes, seconds, millis = (int(part) for part in match.groups())
+    return hours * 3600 + minutes * 60 + seconds + millis / 1000.0
+
+def load_srt_word_timings(srt_path, split_words=True):
     """
-    Process SRT file to show one word at a time with proper timing
-    Returns path to processed SRT file
+    Read an SRT file into a list of (start, end, word) tuples.
+    ttsbot writes one WordBoundary per block; blocks holding several words
+    have their duration split evenly between them, unless split_words is False
+    (paced SRTs, whose blocks are already grouped events).
     """
     if not os.path.exists(srt_path):
         raise ValueError(f"SRT file not found: {srt_path}")
 
-    temp_dir = os.path.join(OUTPUT_DIR, "temp")
-    os.makedirs(temp_dir, exist_ok=True)
-    base_name = os.path.basename(srt_path)
-    temp_srt_path = os.path.join(temp_dir, f"word_by_word_{base_name}")
+    with open(srt_path, 'r', encoding='utf-8') as f:
+        content = f.read().replace('\r\n', '\n')
 
-    try:
-        with open(srt_path, 'r', encoding='utf-8') as infile, \
-             open(temp_srt_path, 'w', encoding='utf-8') as outfile:
-            
-            current_block = []
-            block_number = 1
-            word_index = 0
-            
-            for line in infile:
-                line = line.strip()
-                
-                if line.isdigit():
-                    if current_block:
-                        _write_word_by_word_block(current_block, block_number, outfile)
-                        block_number += len(current_block[2][1].split())  # Increment by word count
-                        current_block = []
-                    current_block.append(line)
-                    
-                elif '-->' in line:
-                    current_block.append(line)
-                    
-                elif line:
-                    current_block.append(line)
-                    
-                else:
-                    if current_block:
-                        _write_word_by_word_block(current_block, block_number, outfile)
-                        block_number += len(current_block[2].split())  # Increment by word count
-                        current_block = []
-                    outfile.write('\n')
-            
-            if current_block:
-                _write_word_by_word_block(current_block, block_number, outfile)
+    words = []
+    for block in re.split(r'\n\s*\n', content):
+        lines = [line.strip() for line in block.strip().split('\n') if line.strip()]
+        timecode_index = next((i for i, line in enumerate(lines) if '-->' in line), None)
+        if timecode_index is None:
+            continue
 
-        os.replace(temp_srt_path, srt_path)
-        return srt_path
+        start, end = lines[timecode_index].split('-->')
+        start, end = _parse_srt_time(start), _parse_srt_time(end)
+        block_words = ' '.join(lines[timecode_index + 1:]).split()
+        if not block_words:
+            continue
+        if not split_words:
+            words.append((start, end, ' '.join(block_words)))
+            continue
 
-    except Exception as e:
-        if os.path.exists(temp_srt_path):
-            os.remove(temp_srt_path)
-        raise RuntimeError(f"Failed to process SRT file: {e}")
+        word_duration = (end - start) / len(block_words)
+        for i, word in enumerate(block_words):
+            words.append((start + i * word_duration, start + (i + 1) * word_duration, word))
+
+    return words
+
+def group_word_timings(words, words_per_event, max_gap, max_chars):
+    """Merge consecutive words into subtitle events to keep the event count down"""
+    events = []
+    current = []
+
+    for start, end, word in words:
+        if current:
+            text_length = sum(len(w) + 1 for _, _, w in current) + len(word)
+            if (len(current) >= words_per_event
+                    or start - current[-1][1] > max_gap
+                    or text_length > max_chars):
+                events.append(current)
+                current = []
+        current.append((start, end, word))
+
+    if current:
+        events.append(current)
+
+    return [(group[0][0], group[-1][1], ' '.join(w for _, _, w in group)) for group in events]
+
+def _ass_time(seconds):
+    """Convert seconds to ASS time format (H:MM:SS.cc)"""
+    centiseconds = int(round(max(seconds, 0) * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+
+def _ass_colour(name, opacity=1.0):
+    """Convert a colour name or 0xRRGGBB string to ASS &HAABBGGRR"""
+    rgb = ASS_COLOURS.get(name.lower()) if not name.lower().startswith('0x') else name[2:]
+    rgb = (rgb or "FFFFFF").upper()
+    alpha = int(round((1.0 - opacity) * 255))
+    return f"&H{alpha:02X}{rgb[4:6]}{rgb[2:4]}{rgb[0:2]}"
+
+def _ass_font_name(font_choice):
+    """ASS wants a family name, not the quoted path get_available_fonts returns for local fonts"""
+    font_choice = font_choice.strip("'")
+    if os.path.sep in font_choice:
+        return os.path.splitext(os.path.basename(font_choice))[0]
+    return font_choice
+
+def build_ass_header(font_name, style_config=STYLE_CONFIG):
+    """Script info and style section with STYLE_CONFIG baked in"""
+    play_res_x, play_res_y = style_config["subtitle_play_res"]
+    style = ','.join(str(value) for value in [
+        "Default",
+        font_name,
+        style_config["font_size"],
+        _ass_colour(style_config["font_color"]),                  # PrimaryColour
+        _ass_colour(style_config["font_color"]),                  # SecondaryColour
+        _ass_colour(style_config["outline_color"]),               # OutlineColour
+        _ass_colour(style_config["background_color"],
+                    style_config["background_opacity"]),          # BackColour
+        -1, 0, 0, 0,                                              # Bold, Italic, Underline, StrikeOut
+        100, 100, 0, 0,                                           # ScaleX, ScaleY, Spacing, Angle
+        3,                                                        # BorderStyle: opaque box
+        style_config["outline_width"],
+        0,                                                        # Shadow
+        2,                                                        # Alignment: bottom center
+        style_config["margin_h"], style_config["margin_h"], style_config["margin_v"],
+        1,                                                        # Encoding
+    ])
+
+    return (
+        "[Script Info]\n"
+        "ScriptType: v4.00+\n"
+        f"PlayResX: {play_res_x}\n"
+        f"PlayResY: {play_res_y}\n"
+        "ScaledBorderAndShadow: yes\n"
+        "WrapStyle: 0\n"
+        "\n"
+        "[V4+ Styles]\n"
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, "
+        "Shadow, Alignment, MarginL, MarginR, MarginV, Encoding\n"
+        f"Style: {style}\n"
+        "\n"
+        "[Events]\n"
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+    )
 
-def _write_word_by_word_block(block, start_block_number, outfile):
-    """Write a subtitle block as individual words with precise timing"""
-    if len(block) < 3:
-        return
+def compile_ass_subtitles(words, ass_path, font_name, style_config=STYLE_CONFIG, words_per_event=None):
+    """
+    Compile word timings straight into a styled ASS file.
+    Each event is held until the next one starts, up to subtitles_duration_buffer.
+    Returns the number of events written.
+    """
+    if words_per_event is None:
+        words_per_event = style_config["words_per_event"]
+
+    events = group_word_timings(
+        words,
+        words_per_event=max(1, words_per_event),
+        max_gap=style_config["max_event_gap"],
+        max_chars=style_config["word_wrap"]
+    )
 
-    # Parse original timecodes
-    timecode_line = block[1]
-    start, end = timecode_line.split(' --> ')
-    start_time = datetime.strptime(start.strip(), "%H:%M:%S,%f")
-    end_time = datetime.strptime(end.strip(), "%H:%M:%S,%f")
-    
-    total_duration = (end_time - start_time).total_seconds()
-    words = block[2].split()
-    word_count = len(words)
-    
-    if word_count == 0:
-        return
-    
-    word_duration = total_duration / word_count
-    
-    # Write each word as separate subtitle
-    for i, word in enumerate(words):
-        word_start = start_time + timedelta(seconds=i * word_duration)
-        word_end = start_time + timedelta(seconds=(i + 1) * word_duration)
-        
-        outfile.write(f"{start_block_number + i}\n")
-        outfile.write(
-            f"{word_start.strftime('%H:%M:%S,%f')[:-3]} --> "
-            f"{word_end.strftime('%H:%M:%S,%f')[:-3]}\n"
-        )
-        outfile.write(f"{word}\n\n")
+    lines = [build_ass_header(font_name, style_config)]
+    buffer = style_config["subtitles_duration_buffer"]
+    for i, (start, end, text) in enumerate(events):
+        end = end + buffer
+        if i + 1 < len(events):
+            end = min(end, events[i + 1][0])
+        text = text.replace('{', '\\{').replace('}', '\\}')
+        lines.append(f"Dialogue: 0,{_ass_time(start)},{_ass_time(end)},Default,,0,0,0,,{text}\n")
 
-def _write_block(block, buffer, outfile):
-    """Helper function to write a single subtitle block"""
-    # Block structure: [ (line_num, content), ... ]
-    if len(block) < 3:
-        return  # Incomplete block
-    
-    # Write block number
-    outfile.write(f"{block[0][1]}\n")
-    
-    # Process and write timecodes
-    if isinstance(block[1][1], tuple):
-        start_time, end_time = block[1][1]
-        # Convert to timedelta for arithmetic operations
-        start_td = timedelta(
-            hours=start_time.hour,
-            minutes=start_time.minute,
-            seconds=start_time.second,
-            microseconds=start_time.microsecond
-        )
-        end_td = timedelta(
-            hours=end_time.hour,
-            minutes=end_time.minute,
-            seconds=end_time.second,
-            microseconds=end_time.microsecond
-        )
-        
-        # Apply buffer (ensuring we don't go negative)
-        buffered_start = max(timedelta(), start_td - buffer)
-        buffered_end = end_td + buffer
-        
-        # Convert back to datetime for formatting
-        buffered_start_dt = datetime.min + buffered_start
-        buffered_end_dt = datetime.min + buffered_end
-        
-        outfile.write(
-            f"{buffered_start_dt.strftime('%H:%M:%S,%f')[:-3]} --> "
-            f"{buffered_end_dt.strftime('%H:%M:%S,%f')[:-3]}\n"
-        )
-    
-    # Write wrapped text lines
-    for line in block[2:]:
-        if isinstance(line[1], str):
-            outfile.write(f"{line[1]}\n")
-    
-    outfile.write("\n")
+    with open(ass_path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
 
-def apply_video_effects(input_video, output_video, effects_config):
-    """Apply visual effects to make background more engaging"""
-    try:
-        effect_filters = []
-        
-        if effects_config.get("blur", False):
-            effect_filters.append("boxblur=2:1")
-        
-        if effects_config.get("saturation", 1.0) != 1.0 or effects_config.get("contrast", 1.0) != 1.0:
-            effect_filters.append(f"eq=saturation={effects_config.get('saturation', 1.0)}:contrast={effects_config.get('contrast', 1.0)}")
-        
-        if effects_config.get("vignette", False):
-            effect_filters.append("vignette=PI/4")
-        
-        if effect_filters:
-            filter_chain = ','.join(effect_filters)
-            subprocess.run(
-                f"ffmpeg -y -i {input_video} -vf \"{filter_chain}\" -c:a copy {output_video}",
-                shell=True,
-                check=True
-            )
-            return output_video
-        
-        return input_video
-    except Exception as e:
-        print(f"Video effects failed, using original: {e}")
-        return input_video
+    return len(events)
 
-def create_short_video(tts_audio_path, srt_path, video_pool):
-    """Create engaging YouTube short using existing subtitles"""
-    base_name = get_base_filename(os.path.basename(tts_audio_path))
-    output_path = os.path.join(OUTPUT_DIR, f"{base_name}_short.mp4")
-    final_output_path = os.path.join(OUTPUT_DIR, f"{base_name}_final.mp4")
-    temp_dir = os.path.join(OUTPUT_DIR, "temp")
-    os.makedirs(temp_dir, exist_ok=True)
+def run_ffmpeg(cmd, step):
+    """Run an ffmpeg command, timed per step"""
+    with metrics.timer("ffmpeg", step=step):
+        subprocess.run(cmd, check=True)
 
+def prepare_render_inputs(tts_audio_path, srt_path, video_pool, subtitle_path, background_path=None):
+    """
+    Shared setup for final and preview renders: probe the audio, pick and grade
+    the background and compile the subtitles to subtitle_path.
+    Returns (audio_duration, video_path).
+    """
     try:
-        audio = AudioSegment.from_mp3(tts_audio_path)
-        audio_duration = len(audio) / 1000.0
+        audio_duration = mediacache.probe_audio_duration(tts_audio_path)
     except Exception as e:
         raise RuntimeError(f"Failed to load audio: {e}")
 
-    video_path = random.choice(video_pool)
+    source_video = background_path or random.choice(video_pool)
+    video_path = get_graded_background(source_video, STYLE_CONFIG["video_effects"])
     
-    # Process SRT file
-    processed_srt_path = os.path.join(temp_dir, f"{base_name}_processed.srt")
-    subprocess.run(["cp", srt_path, processed_srt_path], check=True)
-    preprocess_srt(processed_srt_path)
-
     available_fonts = get_available_fonts()
     font_choice = available_fonts[0] if available_fonts else "Arial"
     print(f"Using font: {font_choice}")
 
-    # Enhanced subtitle style with proper centering and visibility
-    subtitle_style = (
-        f"FontName={font_choice},"
-        f"FontSize={STYLE_CONFIG['font_size']},"
-        f"PrimaryColour=&H00FFFFFF,"  # White text
-        f"Bold=1,"
-        f"OutlineColour=&H00000000,"  # Black outline
-        f"Outline={STYLE_CONFIG['outline_width']},"
-        f"Alignment=2,"  # 2 = center alignment
-        f"MarginV=100,"  # Small margin from bottom
-        f"MarginH=20,"  # Small horizontal margin
-        f"BorderStyle=3,"  # Opaque box
-        f"BackColour=&H80000000"  # Semi-transparent black background
+    # Compile word timings into a styled ASS file; paced SRTs (subtitle_pacing.py) keep their grouping
+    paced = srt_path.endswith('_paced.srt')
+    with metrics.timer("subtitle_compile"):
+        event_count = compile_ass_subtitles(
+            load_srt_word_timings(srt_path, split_words=not paced), subtitle_path, _ass_font_name(font_choice),
+            words_per_event=1 if paced else None
+        )
+    print(f"Compiled {event_count} subtitle events")
+
+    return audio_duration, video_path
+
+def build_render_filter(subtitle_path, height):
+    """
+    Filter graph from background input 0 to [outv]; the ASS canvas scales with height.
+    Includes FINAL_ENHANCE_FILTER, so a short is encoded exactly once with ENCODER_SETTINGS.
+    """
+    escaped_srt_path = subtitle_path.replace("'", "'\\''")  # Proper escaping for shell
+
+    return (
+        f"[0:v]scale=w=-2:h={height},setsar=1[scaled];"
+        f"[scaled]subtitles='{escaped_srt_path}':fontsdir='{FONTS_DIR}'[subtitles];"
+        f"[subtitles]{FINAL_ENHANCE_FILTER},fps=30,format=yuv420p[outv]"
     )
 
-    # Build the filter chain with proper subtitle rendering
-    escaped_srt_path = processed_srt_path.replace("'", "'\\''")  # Proper escaping for shell
+def build_encode_args(encoder):
+    """libx264/aac output arguments for an encoder settings dict"""
+    return [
+        "-c:v", "libx264", "-crf", str(encoder["crf"]), "-preset", encoder["preset"],
+        "-profile:v", encoder["profile"], "-level", encoder["level"],
+        "-threads", str(encoder.get("threads", 0)),
+        "-movflags", "+faststart",
+        "-c:a", "aac", "-b:a", encoder["audio_bitrate"], "-ar", "44100", "-ac", "2",
+    ]
+
+def create_short_video(tts_audio_path, srt_path, video_pool, background_path=None):
+    """Create engaging YouTube short using existing subtitles"""
+    base_name = get_base_filename(os.path.basename(tts_audio_path))
+    output_path = os.path.join(OUTPUT_DIR, f"{base_name}_short.mp4")
+    temp_dir = os.path.join(OUTPUT_DIR, "temp")
+    os.makedirs(temp_dir, exist_ok=True)
+    # Work in temp_dir and move into place at the end, so watchers only ever see finished videos
+    render_path = os.path.join(temp_dir, f"{base_name}_render.mp4")
 
-    filter_complex = (
-        f"[0:v]scale=w=-2:h=1080,setsar=1[scaled];"
-        f"[scaled]subtitles='{escaped_srt_path}':force_style='{subtitle_style}'[subtitles];"
-        f"[subtitles]fps=30,format=yuv420p[outv]"
+    processed_srt_path = os.path.join(temp_dir, f"{base_name}.ass")
+    audio_duration, video_path = prepare_render_inputs(
+        tts_audio_path, srt_path, video_pool, processed_srt_path, background_path
     )
+    filter_complex = build_render_filter(processed_srt_path, 1080)
 
     try:
         cmd = [
@@ -303,37 +342,15 @@ def create_short_video(tts_audio_path, srt_path, video_pool):
             "-map", "[outv]",
             "-map", "1:a",
             "-t", str(audio_duration),
-            "-c:v", "libx264", "-crf", "18", "-preset", "fast",
-            "-profile:v", "high", "-level", "4.0",
-            "-movflags", "+faststart",
-            "-c:a", "aac", "-b:a", "192k", "-ar", "44100", "-ac", "2",
-            "-shortest", output_path
+            *build_encode_args(ENCODER_SETTINGS),
+            "-shortest", render_path
         ]
         
         print("Executing:", " ".join(cmd))
-        subprocess.run(cmd, check=True)
+        run_ffmpeg(cmd, "render")
         
-        if os.path.exists(output_path):
-            # Apply subtle quality enhancements
-            try:
-                cmd = [
-                    "ffmpeg", "-y",
-                    "-i", output_path,
-                    "-vf", "eq=saturation=1.05:contrast=1.02",
-                    "-c:a", "copy",
-                    final_output_path
-                ]
-                print("Executing final enhancement:", " ".join(cmd))
-                subprocess.run(cmd, check=True)
-                
-                if os.path.exists(final_output_path):
-                    # Replace original with enhanced version
-                    os.remove(output_path)
-                    os.rename(final_output_path, output_path)
-            except Exception as e:
-                print(f"Video enhancement failed, using original: {e}")
-                if os.path.exists(final_output_path):
-                    os.remove(final_output_path)
+        if os.path.exists(render_path):
+            os.replace(render_path, output_path)
         else:
             raise RuntimeError("Initial video creation failed")
         
@@ -346,23 +363,86 @@ def create_short_video(tts_audio_path, srt_path, video_pool):
     print(f"Successfully created: {output_path}")
     return output_path
 
+def create_preview(tts_audio_path, srt_path, video_pool, seconds=None, contact_sheet=False,
+                   background_path=None):
+    """
+    Fast draft of a short for checking subtitle placement and style.
+    Same layout and timing as create_short_video, at PREVIEW_HEIGHT with the
+    PREVIEW_ENCODER settings. With contact_sheet a single PNG of sampled
+    frames is written instead of a video.
+    """
+    base_name = get_base_filename(os.path.basename(tts_audio_path))
+    os.makedirs(PREVIEW_DIR, exist_ok=True)
+    subtitle_path = os.path.join(PREVIEW_DIR, f"{base_name}_preview.ass")
+
+    audio_duration, video_path = prepare_render_inputs(
+        tts_audio_path, srt_path, video_pool, subtitle_path, background_path
+    )
+    duration = min(audio_duration, seconds) if seconds else audio_duration
+    filter_complex = build_render_filter(subtitle_path, PREVIEW_HEIGHT)
+
+    if contact_sheet:
+        columns, rows = CONTACT_SHEET_GRID
+        sample_rate = columns * rows / duration
+        output_path = os.path.join(PREVIEW_DIR, f"{base_name}_sheet.png")
+        cmd = [
+            "ffmpeg", "-y",
+            "-stream_loop", "-1",
+            "-i", video_path,
+            "-filter_complex", f"{filter_complex};[outv]fps={sample_rate:.6f},tile={columns}x{rows}[sheet]",
+            "-map", "[sheet]",
+            "-t", str(duration),
+            "-frames:v", "1",
+            output_path
+        ]
+    else:
+        output_path = os.path.join(PREVIEW_DIR, f"{base_name}_preview.mp4")
+        cmd = [
+            "ffmpeg", "-y",
+            "-stream_loop", "-1",
+            "-i", video_path,
+            "-i", tts_audio_path,
+            "-filter_complex", filter_complex,
+            "-map", "[outv]",
+            "-map", "1:a",
+            "-t", str(duration),
+            *build_encode_args(PREVIEW_ENCODER),
+            "-shortest", output_path
+        ]
+
+    try:
+        print("Executing preview:", " ".join(cmd))
+        run_ffmpeg(cmd, "contact_sheet" if contact_sheet else "preview")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Preview render failed: {e}")
+    finally:
+        if os.path.exists(subtitle_path):
+            os.remove(subtitle_path)
+
+    print(f"Preview written: {output_path}")
+    return output_path
+
+def build_effects_filter(effects_config):
+    """Build the ffmpeg filter chain for the background grading effects"""
+    effect_filters = []
+
+    if effects_config.get("blur", False):
+        effect_filters.append("boxblur=2:1")
+
+    if effects_config.get("saturation", 1.0) != 1.0 or effects_config.get("contrast", 1.0) != 1.0:
+        effect_filters.append(f"eq=saturation={effects_config.get('saturation', 1.0)}:contrast={effects_config.get('contrast', 1.0)}")
+
+    if effects_config.get("vignette", False):
+        effect_filters.append("vignette=PI/4")
+
+    return ','.join(effect_filters)
 
 def apply_video_effects(input_video, output_video, effects_config):
     """Apply visual effects to make background more engaging"""
     try:
-        effect_filters = []
-        
-        if effects_config.get("blur", False):
-            effect_filters.append("boxblur=2:1")
-        
-        if effects_config.get("saturation", 1.0) != 1.0 or effects_config.get("contrast", 1.0) != 1.0:
-            effect_filters.append(f"eq=saturation={effects_config.get('saturation', 1.0)}:contrast={effects_config.get('contrast', 1.0)}")
+        filter_chain = build_effects_filter(effects_config)
         
-        if effects_config.get("vignette", False):
-            effect_filters.append("vignette=PI/4")
-        
-        if effect_filters:
-            filter_chain = ','.join(effect_filters)
+        if filter_chain:
             cmd = [
                 "ffmpeg", "-y",
                 "-i", input_video,
@@ -371,13 +451,94 @@ def apply_video_effects(input_video, output_video, effects_config):
                 output_video
             ]
             print("Executing effects:", " ".join(cmd))
-            subprocess.run(cmd, check=True)
+            run_ffmpeg(cmd, "effects")
             return output_video
         
         return input_video
     except Exception as e:
         raise RuntimeError(f"Video effects processing failed: {e}")
 
+def graded_variant_path(video_path, effects_config):
+    """Cache path of the graded variant for (source clip hash, effect parameters)"""
+    effects_key = hashlib.sha256(
+        json.dumps(effects_config, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    clip_key = mediacache.file_sha256(video_path)
+    return os.path.join(BACKGROUND_CACHE_DIR, f"{clip_key[:16]}_{effects_key[:12]}.mp4")
+
+def evict_background_cache(keep=None):
+    """Delete least recently used graded variants until the cache fits its quota"""
+    quota_bytes = BACKGROUND_CACHE_QUOTA_MB * 1024 * 1024
+    entries = []
+    for filename in os.listdir(BACKGROUND_CACHE_DIR):
+        if not filename.endswith('.mp4'):
+            continue
+        path = os.path.join(BACKGROUND_CACHE_DIR, filename)
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= quota_bytes:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        os.remove(path)
+        total -= size
+        print(f"Evicted graded background: {path}")
+
+_grading_locks = {}  # Variant path -> lock, so render workers missing on the same clip grade it once
+_grading_locks_lock = threading.Lock()
+
+def get_graded_background(video_path, effects_config):
+    """
+    Return a pre-graded copy of a background clip, building it on first use.
+    Falls back to the ungraded clip if there is nothing to apply or grading fails.
+    """
+    filter_chain = build_effects_filter(effects_config)
+    if not filter_chain:
+        return video_path
+
+    os.makedirs(BACKGROUND_CACHE_DIR, exist_ok=True)
+    variant_path = graded_variant_path(video_path, effects_config)
+
+    with _grading_locks_lock:
+        variant_lock = _grading_locks.setdefault(variant_path, threading.Lock())
+    with variant_lock:
+        return _build_graded_background(video_path, filter_chain, variant_path)
+
+def _build_graded_background(video_path, filter_chain, variant_path):
+    if os.path.exists(variant_path):
+        os.utime(variant_path)  # Mark as recently used for LRU eviction
+        metrics.inc("bg_cache_hits_total")
+        return variant_path
+
+    # Build into a temp name so an interrupted encode never looks like a cache hit;
+    # unique per process and thread, since another render process may grade the same clip
+    partial_path = f"{variant_path}.{os.getpid()}.{threading.get_ident()}.partial"
+    cmd = [
+        "ffmpeg", "-y",
+        "-i", video_path,
+        "-vf", filter_chain,
+        "-an",
+        "-c:v", "libx264", "-crf", "18", "-preset", "fast",
+        "-pix_fmt", "yuv420p",
+        "-f", "mp4", partial_path
+    ]
+    try:
+        print(f"Building graded background for {os.path.basename(video_path)}")
+        metrics.inc("bg_cache_misses_total")
+        run_ffmpeg(cmd, "grade")
+        os.replace(partial_path, variant_path)
+    except Exception as e:
+        print(f"Background grading failed, using original: {e}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return video_path
+
+    evict_background_cache(keep=variant_path)
+    return variant_path
+
 def find_matching_files():
     """Find all matching TTS, SRT, and text files"""
     files = os.listdir(CLEANED_STORIES_DIR)
@@ -390,18 +551,214 @@ def find_matching_files():
         
         if filename.endswith('_tts.mp3'):
             file_groups[base_name]['tts'] = filename
-        elif filename.endswith('_subs.srt'):
-            file_groups[base_name]['srt'] = filename
+        elif filename.endswith(('_paced.srt', '_subs.srt')):
+            file_groups[base_name]['srt'] = subtitle_filename(base_name)
         elif filename.endswith('_cleaned.txt'):
             file_groups[base_name]['text'] = filename
     
     # Only return groups that have both TTS and SRT
     return {k: v for k, v in file_groups.items() if 'tts' in v and 'srt' in v}
 
-def main():
+def subtitle_filename(base_name):
+    """
+    The paced SRT if subtitle_pacing.py wrote one since ttsbot last wrote its
+    subtitles (same check as subtitle_pacing.find_subtitle_files), else ttsbot's
+    """
+    paced = f"{base_name}_paced.srt"
+    subs = f"{base_name}_subs.srt"
+    try:
+        paced_mtime = os.path.getmtime(os.path.join(CLEANED_STORIES_DIR, paced))
+    except OSError:
+        return subs
+    try:
+        if os.path.getmtime(os.path.join(CLEANED_STORIES_DIR, subs)) > paced_mtime:
+            return subs  # Regenerated after pacing; the paced copy is stale
+    except OSError:
+        pass
+    return paced
+
+def probe_video_pool(video_pool):
+    """Fill the media cache for every background and drop clips ffprobe can't read"""
+    usable = []
+    total_duration = 0.0
+    for video_path in video_pool:
+        try:
+            info = mediacache.probe_video_info(video_path)
+        except Exception as e:
+            print(f"Skipping unreadable background {video_path}: {e}")
+            continue
+        usable.append(video_path)
+        total_duration += info["duration"]
+
+    print(f"Background pool: {len(usable)} clips, {total_duration / 60:.1f} minutes")
+    return usable
+
+def load_encoder_profile():
+    """
+    Apply the per-machine encoder profile recommended by bench_encoder.py.
+    Only crf, preset and threads are taken from it; everything else stays as configured.
+    """
+    if not os.path.exists(ENCODER_PROFILE_FILE):
+        return
+    try:
+        with open(ENCODER_PROFILE_FILE, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable encoder profile: {e}")
+        return
+
+    for key in ("crf", "preset", "threads"):
+        if key in profile:
+            ENCODER_SETTINGS[key] = profile[key]
+    PREVIEW_ENCODER["threads"] = ENCODER_SETTINGS["threads"]
+    print(f"Encoder profile: preset={ENCODER_SETTINGS['preset']} crf={ENCODER_SETTINGS['crf']} "
+          f"threads={ENCODER_SETTINGS['threads']}")
+
+_manifest_lock = threading.Lock()
+
+def load_render_manifest():
+    """Fingerprints of previously rendered outputs, keyed by output filename"""
     try:
-        video_pool = [os.path.join(PROCESSED_VIDEOS_DIR, f) 
-                     for f in os.listdir(PROCESSED_VIDEOS_DIR) if f.endswith(".mp4")]
+        with open(RENDER_MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_render_manifest(manifest, output_name=None, record=None):
+    """
+    Store one output's fingerprint (if given) and write the manifest in one locked step.
+    Entries of stories storage.py has collected are dropped; they are never rendered again.
+    """
+    with _manifest_lock:  # Several render workers may finish at once under the pipeline
+        if output_name is not None:
+            manifest[output_name] = record
+        for name in [n for n in manifest if storage.is_collected(n[:-len("_short.mp4")])]:
+            del manifest[name]
+        temp_path = f"{RENDER_MANIFEST_FILE}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(temp_path, RENDER_MANIFEST_FILE)
+
+def load_uploaded_videos():
+    """Outputs already published (and deleted locally) by any channel"""
+    import upload_scheduler  # Each channel logs its uploads to its own file
+    return upload_scheduler.load_all_upload_logs()
+
+def render_config_hash():
+    """Hash of everything besides the inputs that changes what a render looks like"""
+    config = {
+        "style": STYLE_CONFIG,
+        "encoder": ENCODER_SETTINGS,
+        "revision": RENDER_REVISION,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+def check_render(output_name, tts_path, srt_path, record, uploaded, video_pool, config_hash):
+    """
+    Decide whether an output needs rendering.
+    Returns (needs_render, reason, background) where background is the clip
+    the previous render used if it is still in the pool, else None.
+    """
+    if output_name in uploaded:
+        return False, "already uploaded", None
+    if record is None:
+        return True, "new", None
+
+    background = record.get("background")
+    if background not in video_pool:
+        return True, "background removed", None
+    if mediacache.file_sha256(background) != record.get("background_sha256"):
+        return True, "background changed", None
+
+    if mediacache.file_sha256(tts_path) != record.get("audio_sha256"):
+        return True, "audio changed", background
+    if mediacache.file_sha256(srt_path) != record.get("subs_sha256"):
+        return True, "subtitles changed", background
+    if record.get("config") != config_hash:
+        return True, "style/encoder config changed", background
+    if not os.path.exists(os.path.join(OUTPUT_DIR, output_name)):
+        return True, "output missing", background
+
+    return False, "up to date", None
+
+def load_video_pool():
+    """Probed background clips from PROCESSED_VIDEOS_DIR"""
+    video_pool = [os.path.join(PROCESSED_VIDEOS_DIR, f) 
+                 for f in os.listdir(PROCESSED_VIDEOS_DIR) if f.endswith(".mp4")]
+    return probe_video_pool(video_pool)
+
+def render_group(base_name, files, video_pool, manifest, uploaded, config_hash):
+    """
+    Render one story unless its output is up to date, recording its fingerprint.
+    Returns (outcome, output_path) where output_path is None when skipped.
+    """
+    output_name = f"{base_name}_short.mp4"
+    tts_path = os.path.join(CLEANED_STORIES_DIR, files['tts'])
+    srt_path = os.path.join(CLEANED_STORIES_DIR, files['srt'])
+
+    needs_render, reason, background = check_render(
+        output_name, tts_path, srt_path, manifest.get(output_name),
+        uploaded, video_pool, config_hash
+    )
+    if not needs_render:
+        print(f"Skipping {base_name} ({reason})")
+        metrics.inc("renders_skipped_total", reason=reason)
+        return f"skipped: {reason}", None
+
+    print(f"\nProcessing {base_name} ({reason})...")
+    background = background or random.choice(video_pool)
+    output_path = create_short_video(tts_path, srt_path, video_pool, background_path=background)
+
+    record = {
+        "audio_sha256": mediacache.file_sha256(tts_path),
+        "subs_sha256": mediacache.file_sha256(srt_path),
+        "background": background,
+        "background_sha256": mediacache.file_sha256(background),
+        "config": config_hash,
+    }
+    save_render_manifest(manifest, output_name, record)
+    metrics.inc("renders_total", reason=reason)
+    return f"rendered: {reason}", output_path
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render YouTube shorts from cleaned stories")
+    parser.add_argument("--preview", action="store_true",
+                        help=f"Fast draft render into {PREVIEW_DIR} instead of {OUTPUT_DIR}")
+    parser.add_argument("--seconds", type=float, default=None,
+                        help="Preview only the first N seconds")
+    parser.add_argument("--contact-sheet", action="store_true",
+                        help="Preview as a PNG grid of sampled frames")
+    parser.add_argument("--only", default=None,
+                        help="Only process stories whose name contains this text")
+    parser.add_argument("--channels", default=None,
+                        help="Channel definitions whose upload logs mark stories as done (default BOT_CHANNELS_FILE or channels.json)")
+    return parser.parse_args(argv)
+
+def run_previews(file_groups, video_pool, args):
+    """Render previews for every selected group; never touches the render manifest"""
+    for base_name, files in file_groups.items():
+        print(f"\nPreviewing {base_name}...")
+        try:
+            create_preview(
+                os.path.join(CLEANED_STORIES_DIR, files['tts']),
+                os.path.join(CLEANED_STORIES_DIR, files['srt']),
+                video_pool,
+                seconds=args.seconds,
+                contact_sheet=args.contact_sheet
+            )
+        except Exception as e:
+            print(f"Error previewing {base_name}: {e}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.channels:
+        import upload_scheduler
+        upload_scheduler.use_channels_file(args.channels)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(FONTS_DIR, exist_ok=True)
+    load_encoder_profile()
+    try:
+        video_pool = load_video_pool()
 
         if not video_pool:
             print("No video files found in processed_videos directory")
@@ -412,20 +769,35 @@ def main():
             print("No matching TTS and SRT file pairs found in cleaned_stories directory")
             return
 
+        if args.only:
+            file_groups = {k: v for k, v in file_groups.items() if args.only in k}
+
         print(f"Found {len(file_groups)} file groups and {len(video_pool)} background videos")
 
+        if args.preview:
+            run_previews(file_groups, video_pool, args)
+            return
+
+        manifest = load_render_manifest()
+        uploaded = load_uploaded_videos()
+        config_hash = render_config_hash()
+        summary = {}
+
         for base_name, files in file_groups.items():
-            print(f"\nProcessing {base_name}...")
             try:
-                tts_path = os.path.join(CLEANED_STORIES_DIR, files['tts'])
-                srt_path = os.path.join(CLEANED_STORIES_DIR, files['srt'])
-                create_short_video(tts_path, srt_path, video_pool)
+                outcome, _ = render_group(base_name, files, video_pool, manifest, uploaded, config_hash)
+                summary.setdefault(outcome, []).append(base_name)
             except Exception as e:
                 print(f"Error processing {base_name}: {e}")
+                summary.setdefault("failed", []).append(base_name)
                 continue
 
+        print("\nRender summary:")
+        for outcome, names in sorted(summary.items()):
+            print(f"  {outcome}: {len(names)}")
+
     except Exception as e:
         print(f"Fatal error: {e}")
 
 if __name__ == "__main__":
-    main()
+    metrics.run_main(main, "generatevideo")
@@ -0,0 +1,164 @@
+import os
+import json
+import hashlib
+import threading
+import subprocess
+
+import metrics
+
+# Config
+MEDIA_CACHE_FILE = "./media_cache.json"
+
+_cache = None
+_lock = threading.RLock()
+
+def _load_cache():
+    """Load the cache file once per process"""
+    global _cache
+    if _cache is None:
+        try:
+            with open(MEDIA_CACHE_FILE, 'r', encoding='utf-8') as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+        _cache.setdefault("files", {})
+        _cache.setdefault("fonts", {})
+    return _cache
+
+def _prune(cache):
+    """Drop entries for files that no longer exist, e.g. after storage.py collected them"""
+    for section in ("files", "fonts"):
+        entries = cache[section]
+        for key in [k for k, v in entries.items() if not os.path.exists(v["file"] if section == "fonts" else k)]:
+            del entries[key]
+
+def save_media_cache():
+    """Write the cache atomically so a killed run never leaves a torn file"""
+    with _lock:
+        cache = _load_cache()
+        _prune(cache)
+        temp_path = f"{MEDIA_CACHE_FILE}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+        os.replace(temp_path, MEDIA_CACHE_FILE)
+
+def _file_entry(path):
+    """Cache entry for a file, reset whenever its size or mtime changes"""
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    files = _load_cache()["files"]
+    entry = files.get(key)
+    if not entry or entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        files[key] = entry
+    return entry
+
+def _cached(path, field, compute):
+    """Return entry[field] for path, computing and persisting it on a miss"""
+    with _lock:
+        entry = _file_entry(path)
+        if field in entry:
+            metrics.inc("media_cache_hits_total", field=field)
+            return entry[field]
+
+    metrics.inc("media_cache_misses_total", field=field)
+    with metrics.timer("media_probe", field=field):
+        value = compute(path)
+
+    with _lock:
+        _file_entry(path)[field] = value
+        save_media_cache()
+    return value
+
+def _sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _ffprobe(path, *args):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", *args, "-of", "json", path],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout)
+
+def _probe_audio(path):
+    """Duration from the container header; only decodes if ffprobe is unavailable"""
+    try:
+        info = _ffprobe(path, "-show_entries", "format=duration")
+        return float(info["format"]["duration"])
+    except (OSError, subprocess.CalledProcessError, KeyError, ValueError):
+        from pydub import AudioSegment
+        return len(AudioSegment.from_file(path)) / 1000.0
+
+def _probe_video(path):
+    info = _ffprobe(
+        path,
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height,r_frame_rate,codec_name:format=duration"
+    )
+    stream = info["streams"][0]
+    num, _, den = stream.get("r_frame_rate", "0/1").partition("/")
+    fps = float(num) / float(den) if den and float(den) else float(num)
+    return {
+        "width": int(stream["width"]),
+        "height": int(stream["height"]),
+        "fps": fps,
+        "codec": stream.get("codec_name"),
+        "duration": float(info["format"]["duration"]),
+    }
+
+def file_sha256(path):
+    """sha256 of a file's contents"""
+    return _cached(path, "sha256", _sha256)
+
+def probe_audio_duration(path):
+    """Audio duration in seconds"""
+    return _cached(path, "duration", _probe_audio)
+
+def probe_video_info(path):
+    """Width, height, fps, codec and duration of the first video stream"""
+    return _cached(path, "video", _probe_video)
+
+def resolve_font(name, fonts_dir):
+    """
+    Resolve a font name to a file, via fc-match first and then fonts_dir.
+    Returns (kind, file) with kind "system" or "local", or None if not found.
+    """
+    with _lock:
+        fonts = _load_cache()["fonts"]
+        cached = fonts.get(name)
+        if cached and os.path.exists(cached["file"]):
+            metrics.inc("media_cache_hits_total", field="font")
+            return cached["kind"], cached["file"]
+
+    metrics.inc("media_cache_misses_total", field="font")
+
+    resolved = None
+    try:
+        result = subprocess.run(
+            ["fc-match", "-f", "%{file}\n", name],
+            capture_output=True,
+            text=True
+        )
+        if result.returncode == 0 and os.path.exists(result.stdout.strip()):
+            resolved = {"kind": "system", "file": result.stdout.strip()}
+    except Exception:
+        pass
+
+    if resolved is None:
+        local_font = os.path.join(fonts_dir, f"{name}.ttf")
+        if os.path.exists(local_font):
+            resolved = {"kind": "local", "file": local_font}
+
+    if resolved is None:
+        return None
+
+    with _lock:
+        _load_cache()["fonts"][name] = resolved
+        save_media_cache()
+    return resolved["kind"], resolved["file"]
@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+# Config
+METRICS_DIR = os.getenv("BOT_METRICS_DIR", "./metrics")
+PROMETHEUS_FILE = os.path.join(METRICS_DIR, "{stage}.prom")  # One per process, for node_exporter's textfile collector
+TRACE_FILE = os.path.join(METRICS_DIR, "trace.jsonl")  # Shared by all processes
+TRACE_MAX_BYTES = 64 * 1024 * 1024  # Above this the trace is rotated to trace.jsonl.1, replacing the previous one
+FLUSH_INTERVAL = 15  # Seconds between Prometheus textfile rewrites
+HISTOGRAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Opt-in profiling for a single run:
+#   BOT_PROFILE=cprofile python generatevideo.py   -> metrics/generatevideo.prof (snakeviz, pstats)
+#   BOT_PROFILE=pyspy python generatevideo.py      -> prints the py-spy command and waits for it to attach
+PROFILE_MODE = os.getenv("BOT_PROFILE", "")
+PROFILE_WAIT = float(os.getenv("BOT_PROFILE_WAIT", "5"))
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_last_flush = 0.0
+_trace_file = None
+_stage = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "bot"  # Set by run_main()
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc(name, value=1, **labels):
+    """Add to a counter"""
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+    _maybe_flush()
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+    _maybe_flush()
+
+def observe(name, value, **labels):
+    """Record a value (seconds, for latencies) into a histogram"""
+    with _lock:
+        key = _key(name, labels)
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(HISTOGRAM_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+    _maybe_flush()
+
+def trace(name, start, duration, ok=True, **labels):
+    """Append one span to the JSONL trace"""
+    global _trace_file
+    record = {
+        "ts": round(start, 6),
+        "name": name,
+        "duration": round(duration, 6),
+        "ok": ok,
+        "labels": labels,
+        "pid": os.getpid(),
+        "thread": threading.current_thread().name,
+    }
+    with _lock:
+        if _trace_file is None:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            _trace_file = open(TRACE_FILE, "a", encoding="utf-8", buffering=1)
+        _trace_file.write(json.dumps(record) + "\n")
+        if os.fstat(_trace_file.fileno()).st_size >= TRACE_MAX_BYTES:
+            _rotate_trace()
+
+def _rotate_trace():
+    """Move the full trace aside and start a new one; call with _lock held"""
+    global _trace_file
+    opened = os.fstat(_trace_file.fileno())
+    _trace_file.close()
+    _trace_file = None
+    try:
+        current = os.stat(TRACE_FILE)
+        if (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+            os.replace(TRACE_FILE, f"{TRACE_FILE}.1")
+        # Otherwise another process rotated it already and we were writing into the old one
+    except OSError:
+        pass
+
+@contextmanager
+def timer(name, **labels):
+    """Time a block into the {name}_seconds histogram and the trace"""
+    start = time.time()
+    started = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        observe(f"{name}_seconds", duration, **labels)
+        if not ok:
+            inc(f"{name}_errors_total", **labels)
+        trace(name, start, duration, ok, **labels)
+
+def timed(name, **labels):
+    """Decorator form of timer()"""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+def timed_iter(name, iterable, **labels):
+    """Yield from iterable, timing each next() (e.g. lazily paged API listings)"""
+    iterator = iter(iterable)
+    while True:
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        duration = time.perf_counter() - started
+        observe(f"{name}_seconds", duration, **labels)
+        if duration > 0.05:  # Only spans that actually hit the network go to the trace
+            trace(name, start, duration, **labels)
+        yield item
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def render_prometheus():
+    """Current metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        for kind, series in (("counter", _counters), ("gauge", _gauges)):
+            seen = set()
+            for (name, labels), value in sorted(series.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} {kind}")
+                    seen.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        seen = set()
+        for (name, labels), histogram in sorted(_histograms.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram")
+                seen.add(name)
+            for bound, count in zip(HISTOGRAM_BUCKETS, histogram["buckets"]):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+def flush():
+    """Rewrite the Prometheus textfile atomically"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    prometheus_file = PROMETHEUS_FILE.format(stage=_stage)
+    temp_path = f"{prometheus_file}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(temp_path, prometheus_file)
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        try:
+            flush()
+        except OSError as e:
+            print(f"Metrics flush failed: {e}")
+
+@atexit.register
+def _flush_at_exit():
+    if _counters or _gauges or _histograms:
+        flush()
+
+def run_main(main, name=None):
+    """
+    Entry point wrapper: times the whole run and applies BOT_PROFILE if set.
+    Metrics go to metrics/<name>.prom. Returns whatever main() returns.
+    """
+    global _stage
+    name = name or _stage
+    _stage = name
+
+    if PROFILE_MODE == "pyspy":
+        print(f"PID {os.getpid()}: py-spy record -o {os.path.join(METRICS_DIR, name)}.svg --pid {os.getpid()}")
+        time.sleep(PROFILE_WAIT)
+
+    if PROFILE_MODE == "cprofile":
+        import cProfile
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        profile_path = os.path.join(METRICS_DIR, f"{name}.prof")
+        profiler = cProfile.Profile()
+        try:
+            with timer("run", stage=name):
+                return profiler.runcall(main)
+        finally:
+            profiler.dump_stats(profile_path)
+            print(f"Profile written to {profile_path}")
+
+    with timer("run", stage=name):
+        return main()
@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+from pathlib import Path
+
+import metrics
+import storage
+import redditbot
+import ttsbot
+import generatevideo
+import upload_scheduler
+
+# Config
+QUEUE_SIZE = 8  # Stories waiting per stage before the stage upstream blocks
+TTS_WORKERS = 2  # OpenAI + Edge TTS are network bound
+RENDER_WORKERS = 1  # libx264 already uses every core
+SCRAPE_INTERVAL_HOURS = 6
+
+_STOP = object()
+
+class Stage:
+    """A pool of worker threads reading from a bounded input queue"""
+    def __init__(self, name, handler, workers, output=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.input = queue.Queue(maxsize=QUEUE_SIZE)
+        self.output = output
+        self.processed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            item = self.input.get()
+            metrics.set_gauge("pipeline_queue_depth", self.input.qsize(), stage=self.name)
+            if item is _STOP:
+                return
+            try:
+                with metrics.timer("pipeline_stage", stage=self.name):
+                    result = self.handler(item)
+                with self.lock:
+                    self.processed += 1
+            except Exception as e:
+                print(f"[{self.name}] Failed: {e}")
+                with self.lock:
+                    self.failed += 1
+                continue
+            if result is not None and self.output is not None:
+                self.output.put(result)  # Blocks while downstream is full: backpressure
+
+    def close(self):
+        """Let queued work finish, then stop the workers"""
+        for _ in self.threads:
+            self.input.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+class Pipeline:
+    """
+    redditbot -> ttsbot -> generatevideo -> youtubeupload in one process.
+    Each story moves to the next stage as soon as the previous one is done with it.
+    """
+    def __init__(self, tts_workers, render_workers, scheduler=None):
+        self.scheduler = scheduler
+        self.video_pool = generatevideo.load_video_pool()
+        if not self.video_pool:
+            raise RuntimeError("No video files found in processed_videos directory")
+        self.manifest = generatevideo.load_render_manifest()
+        self.config_hash = generatevideo.render_config_hash()
+        self.in_tts = set()
+        self.rendering = set()
+        self.rendering_lock = threading.Lock()
+        self.seeder = threading.Thread(target=self.seed_backlog, name="seed", daemon=True)
+
+        self.render = Stage("render", self.render_story, render_workers)
+        self.tts = Stage("tts", self.tts_story, tts_workers, output=self.render.input)
+
+    def tts_story(self, row):
+        """Index row in, base name out"""
+        base_name = Path(row[0]).stem
+        with self.rendering_lock:
+            if base_name in self.in_tts:
+                return None  # Queued twice (backlog seed and a fresh scrape); the other worker forwards it
+            self.in_tts.add(base_name)
+
+        try:
+            ttsbot.process_story(row)
+        finally:
+            with self.rendering_lock:
+                self.in_tts.discard(base_name)
+        return base_name
+
+    def render_story(self, base_name):
+        with self.rendering_lock:
+            if base_name in self.rendering:
+                return None  # Already being rendered by another worker
+            self.rendering.add(base_name)
+
+        try:
+            # Re-read per story: the scheduler deletes videos once they are uploaded
+            uploaded = generatevideo.load_uploaded_videos()
+            files = {'tts': f"{base_name}_tts.mp3", 'srt': generatevideo.subtitle_filename(base_name)}
+            outcome, output_path = generatevideo.render_group(
+                base_name, files, self.video_pool, self.manifest, uploaded, self.config_hash
+            )
+        finally:
+            with self.rendering_lock:
+                self.rendering.discard(base_name)
+
+        print(f"[render] {base_name}: {outcome}")
+        if output_path and self.scheduler:
+            self.scheduler.notify_new_video(output_path)
+        return None
+
+    def start(self):
+        os.makedirs(ttsbot.OUTPUT_DIR, exist_ok=True)
+        self.render.start()
+        self.tts.start()
+        self.seeder.start()
+
+    def seed_backlog(self):
+        """Feed stories left over from earlier runs into the first stage that still needs them"""
+        for base_name in generatevideo.find_matching_files():
+            self.render.input.put(base_name)
+
+        if os.path.exists(ttsbot.INDEX_FILE):
+            with open(ttsbot.INDEX_FILE, 'r', encoding='utf-8') as f:
+                rows = [line.rstrip('\n').split('|') for line in f][1:]
+            for row in rows:
+                base_name = Path(row[0]).stem
+                if storage.is_collected(base_name):
+                    continue
+                if not os.path.exists(os.path.join(ttsbot.OUTPUT_DIR, f"{base_name}_subs.srt")):
+                    self.tts.input.put(row)
+
+    def scrape(self):
+        """One scrape pass; a failure is logged and the next pass tries again"""
+        try:
+            redditbot.fetch_and_save_stories(on_story=self.tts.input.put)
+        except Exception as e:
+            print(f"[scrape] Failed: {e}")
+            metrics.inc("pipeline_scrape_failures_total")
+
+    def drain(self):
+        self.seeder.join()
+        self.tts.close()
+        self.render.close()
+        print(f"\nPipeline done: tts {self.tts.processed} ok / {self.tts.failed} failed, "
+              f"render {self.render.processed} ok / {self.render.failed} failed")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run scraping, TTS, rendering and uploads as one streaming pipeline")
+    parser.add_argument("--once", action="store_true",
+                        help="One scrape pass, drain the queues and exit (no uploads)")
+    parser.add_argument("--no-upload", action="store_true", help="Leave finished videos for youtubeupload")
+    parser.add_argument("--tts-workers", type=int, default=TTS_WORKERS)
+    parser.add_argument("--render-workers", type=int, default=RENDER_WORKERS)
+    parser.add_argument("--scrape-interval", type=float, default=SCRAPE_INTERVAL_HOURS,
+                        help="Hours between scrape passes")
+    parser.add_argument("--channels", default=upload_scheduler.CHANNELS_FILE,
+                        help="Channel definitions (JSON); also BOT_CHANNELS_FILE")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    upload_scheduler.use_channels_file(args.channels)  # Render skips what any of these channels uploaded
+    generatevideo.load_encoder_profile()
+
+    scheduler = None
+    if not args.once and not args.no_upload:
+        scheduler = upload_scheduler.UploadScheduler(upload_scheduler.load_channel_configs(args.channels))
+        scheduler.authenticate()
+        threading.Thread(target=scheduler.run, name="scheduler", daemon=True).start()
+
+    pipeline = Pipeline(args.tts_workers, args.render_workers, scheduler)
+    pipeline.start()
+
+    try:
+        while True:
+            pipeline.scrape()
+            if args.once:
+                break
+            print(f"Next scrape in {args.scrape_interval:g} hours")
+            time.sleep(args.scrape_interval * 3600)
+        pipeline.drain()
+    except KeyboardInterrupt:
+        print("\nStopping pipeline...")
+    finally:
+        if scheduler:
+            scheduler.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(metrics.run_main(main, "pipeline"))
@@ -0,0 +1,6 @@
+#!/bin/bash
+# Dependencies are installed once into the venv (see the per-stage scripts);
+# the pipeline itself never runs pip.
+source /home/art3m1sf0wl/program/botyt/myenv/bin/activate
+cd /home/art3m1sf0wl/program/botyt
+python3 /home/art3m1sf0wl/program/botyt/pipeline.py "$@"
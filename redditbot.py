@@ -1,13 +1,19 @@
 import os
-import praw
+import sys
+import json
+import zipfile
+import traceback
+import metrics
+import storage
 from datetime import datetime
 
 # Reddit API Setup (replace with your keys)
-reddit = praw.Reddit(
+REDDIT_CREDENTIALS = dict(
     client_id="4Id68y9aRCnG2V96nUzXbw",      # e.g., "xYz123..."
     client_secret="FinWwJNa49PLJa2RI8QN07M786wEnQ",  # e.g., "aBc456..."
     user_agent="YT_Shorts_Bot/v1.0"  # Any name
 )
+reddit = None  # Built by get_reddit() on first use
 # Config
 SUBREDDITS = ["MilitaryStories", "TrueOffMyChest", "EntitledPeople", "GlitchInTheMatrix", "TalesFromRetail", "AskReddit"]  # Target subreddits
 MIN_UPVOTES = 1500  # Minimum upvotes to consider
@@ -19,9 +25,15 @@ min_tts = 100
 max_tts = 1000
 TIME_FILTER = "all"  # "hour", "day", "week", "month", "year", "all"
 MAX_FILENAME_LENGTH = 100  # Limit filename length to prevent errors
+SCRAPED_POSTS_FILE = os.path.join(OUTPUT_DIR, "scraped_posts.json")  # Post id -> story filename, kept across runs
 
-# Create output dir
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+def get_reddit():
+    """The praw client, created on first use so importing this module stays cheap"""
+    global reddit
+    if reddit is None:
+        import praw
+        reddit = praw.Reddit(**REDDIT_CREDENTIALS)
+    return reddit
 
 def estimate_tts_time(text):
     return len(text.split()) / 2.5
@@ -33,10 +45,44 @@ def sanitize_filename(title):
 def get_word_count(text):
     return len(text.split())
 
-def fetch_and_save_stories():
+def load_scraped_posts():
+    """
+    Story filename of every post saved so far, by post id. Stories saved before
+    this file existed are matched by title instead, ignoring the date prefix.
+    """
     try:
+        with open(SCRAPED_POSTS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_scraped_posts(scraped):
+    temp_path = f"{SCRAPED_POSTS_FILE}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(scraped, f, indent=1, sort_keys=True)
+    os.replace(temp_path, SCRAPED_POSTS_FILE)
+
+def saved_stories_by_title():
+    """Existing story filenames keyed by the part after their YYYYMMDD_ prefix"""
+    names = [name for name in os.listdir(OUTPUT_DIR) if name.endswith('.txt')]
+    archive_path = os.path.join(OUTPUT_DIR, os.path.basename(storage.STORY_ARCHIVE))
+    if os.path.exists(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            names.extend(archive.namelist())
+    return {name[9:]: name for name in sorted(names) if name[:8].isdigit() and name[8:9] == '_'}
+
+def fetch_and_save_stories(on_story=None):
+    """Scrape SUBREDDITS and save matching stories; on_story(fields) is called per saved story"""
+    import praw
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    try:
+        reddit = get_reddit()
         print(f"Reddit authorized as: {reddit.user.me()}\n")
         
+        # Filenames carry the scrape date, so without this a post still in top/all
+        # tomorrow would be saved, voiced, rendered and uploaded a second time
+        scraped = load_scraped_posts()
+        by_title = saved_stories_by_title()
         index = []
         index_header = (
             "filename|title|upvotes|comments|subreddit|source|word_count|"
@@ -48,10 +94,12 @@ def fetch_and_save_stories():
                 subreddit = reddit.subreddit(subreddit_name)
                 print(f"🔍 Scanning r/{subreddit_name} (top/{TIME_FILTER})...")
                 
-                for post in subreddit.top(time_filter=TIME_FILTER, limit=500000):
+                posts = subreddit.top(time_filter=TIME_FILTER, limit=500000)
+                for post in metrics.timed_iter("reddit_listing_fetch", posts, subreddit=subreddit_name):
                     try:
                         if post.stickied:
                             continue
+                        metrics.inc("reddit_posts_scanned_total", subreddit=subreddit_name)
                             
                         print(f"\n📄 Post: {post.title[:50]}...")
                         print(f"⬆️ {post.score} upvotes | 💬 {post.num_comments} comments")
@@ -63,7 +111,8 @@ def fetch_and_save_stories():
                         # Handle AskReddit special case
                         if not story_text and subreddit_name == "AskReddit":
                             try:
-                                post.comments.replace_more(limit=0)
+                                with metrics.timer("reddit_comments_fetch", subreddit=subreddit_name):
+                                    post.comments.replace_more(limit=0)
                                 if post.comments:
                                     story_text = post.comments[0].body
                                     source = "top_comment"
@@ -96,25 +145,35 @@ def fetch_and_save_stories():
                                     author_name = str(post.author) if post.author else "[deleted]"
                                     flair = str(post.link_flair_text) if post.link_flair_text else ""
                                     
-                                    # Save story file
-                                    filename = f"{datetime.now().strftime('%Y%m%d')}_{sanitize_filename(post.title)}.txt"
-                                    filepath = os.path.join(OUTPUT_DIR, filename)
-                                    
-                                    if len(filepath) > 255:
-                                        filename = f"{datetime.now().strftime('%Y%m%d')}_{hash(post.title)}.txt"
+                                    # Save story file, unless an earlier scrape already did
+                                    filename = scraped.get(post.id) or by_title.get(f"{sanitize_filename(post.title)}.txt")
+                                    is_new = filename is None
+                                    if is_new:
+                                        filename = f"{datetime.now().strftime('%Y%m%d')}_{sanitize_filename(post.title)}.txt"
                                         filepath = os.path.join(OUTPUT_DIR, filename)
-                                    
-                                    with open(filepath, "w", encoding="utf-8") as f:
-                                        f.write(f"{post.title.upper()}\n\n{story_text}")
+                                        
+                                        if len(filepath) > 255:
+                                            filename = f"{datetime.now().strftime('%Y%m%d')}_{hash(post.title)}.txt"
+                                            filepath = os.path.join(OUTPUT_DIR, filename)
+                                        
+                                        with open(filepath, "w", encoding="utf-8") as f:
+                                            f.write(f"{post.title.upper()}\n\n{story_text}")
+                                    scraped[post.id] = filename
                                     
                                     # Add to index with all metadata
-                                    index_entry = (
-                                        f"{filename}|{post.title}|{post.score}|{post.num_comments}|"
-                                        f"{subreddit_name}|{source}|{word_count}|{tts_time:.1f}|"
-                                        f"{created_utc}|{post.url}|{author_name}|{flair}|{saved_date}\n"
-                                    )
-                                    index.append(index_entry)
+                                    fields = [
+                                        filename, post.title, str(post.score), str(post.num_comments),
+                                        subreddit_name, source, str(word_count), f"{tts_time:.1f}",
+                                        created_utc, post.url, author_name, flair, saved_date
+                                    ]
+                                    index.append("|".join(fields) + "\n")  # Kept in the index so unfinished stories resume
+                                    if not is_new:
+                                        print(f"↩️ Already scraped as {filename}")
+                                        continue
                                     print(f"✅ SAVED: {filename}")
+                                    metrics.inc("reddit_stories_saved_total", subreddit=subreddit_name)
+                                    if on_story:
+                                        on_story(fields)
                                 except Exception as e:
                                     print(f"⚠️ Error saving file: {str(e)}")
                                     continue
@@ -147,12 +206,16 @@ def fetch_and_save_stories():
             print("\n📊 Index file saved with complete metadata")
         except Exception as e:
             print(f"⚠️ Error saving index file: {str(e)}")
+        save_scraped_posts(scraped)
     
     except Exception as e:
         print(f"🔥 Critical error: {str(e)}")
-        traceback.print_exc()
-        sys.exit(1)
+        raise  # Callers like the pipeline decide whether to retry or exit
 
 if __name__ == "__main__":
-    fetch_and_save_stories()
+    try:
+        metrics.run_main(fetch_and_save_stories, "redditbot")
+    except Exception:
+        traceback.print_exc()
+        sys.exit(1)
     print("\nScraping complete. Check the 'stories' folder!")
@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import zipfile
+from datetime import datetime
+
+import metrics
+
+# Config
+STORIES_DIR = "stories"
+CLEANED_STORIES_DIR = "cleaned_stories"
+PROCESSED_VIDEOS_DIR = "processed_videos"
+VIDEOS_DIR = "videos"
+STORY_ARCHIVE = os.path.join(STORIES_DIR, "archive.zip")  # Cold story text, read back lazily
+LEDGER_FILE = "storage_ledger.json"  # Stories whose intermediates were collected
+STORAGE_QUOTA_MB = 20480  # Managed directories together; consumed artifacts are collected LRU above this
+TEMP_DIRS = [os.path.join(VIDEOS_DIR, "temp"), "temp_downloads"]
+TEMP_MAX_AGE_HOURS = 6  # Younger temp files may belong to a render or download still running
+STORY_ARCHIVE_AGE_DAYS = 2  # Story text untouched this long after TTS is packed into STORY_ARCHIVE
+
+# What each artifact is for, and when it has been consumed:
+#   stories/<base>.txt                      ttsbot input; cold once the cleaned outputs exist
+#   cleaned_stories/<base>_{cleaned.txt,tts.mp3,subs.srt,paced.srt}
+#                                           generatevideo input; consumed once <base>_short.mp4 is uploaded
+#   videos/temp/*, temp_downloads/*         render/download scratch; garbage once stale
+#   videos/bg_cache/*                       graded backgrounds; generatevideo's own LRU quota
+#   processed_videos/*.mp4                  background pool; never consumed, never collected
+MANAGED_DIRS = [STORIES_DIR, CLEANED_STORIES_DIR, PROCESSED_VIDEOS_DIR, VIDEOS_DIR, "temp_downloads"]
+TTS_OUTPUT_SUFFIXES = ["_cleaned.txt", "_tts.mp3", "_subs.srt"]
+CLEANED_SUFFIXES = TTS_OUTPUT_SUFFIXES + ["_paced.srt"]  # Plus subtitle_pacing.py's optional re-timed SRT
+
+_ledger_lock = threading.Lock()
+_ledger = None
+_ledger_mtime = None
+
+def _file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def load_ledger():
+    """
+    Collected stories by base name. Re-read whenever the file changes, so a
+    long-running pipeline sees what a separate `bot.py gc` collected.
+    """
+    global _ledger, _ledger_mtime
+    with _ledger_lock:
+        mtime = _file_mtime(LEDGER_FILE)
+        if _ledger is None or mtime != _ledger_mtime:
+            try:
+                with open(LEDGER_FILE, 'r', encoding='utf-8') as f:
+                    _ledger = json.load(f)
+            except (OSError, ValueError):
+                _ledger = {}
+            _ledger_mtime = mtime
+        return _ledger
+
+def save_ledger(collected):
+    """Add collected entries to the ledger on disk, merging with what other processes wrote"""
+    global _ledger_mtime
+    load_ledger()  # Pick up the current file first
+    with _ledger_lock:
+        _ledger.update(collected)
+        temp_path = f"{LEDGER_FILE}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(_ledger, f, indent=1, sort_keys=True)
+        os.replace(temp_path, LEDGER_FILE)
+        _ledger_mtime = _file_mtime(LEDGER_FILE)
+
+def is_collected(base_name):
+    """True once a story's intermediates were deleted after upload; stages must not rebuild it"""
+    return base_name in load_ledger()
+
+def read_story_text(filename, stories_dir=STORIES_DIR):
+    """A story's raw text, from stories_dir or else from the packed archive"""
+    path = os.path.join(stories_dir, filename)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    archive_path = os.path.join(stories_dir, os.path.basename(STORY_ARCHIVE))
+    if os.path.exists(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            try:
+                return archive.read(filename).decode('utf-8')
+            except KeyError:
+                pass
+    raise FileNotFoundError(f"Story not found in {stories_dir} or its archive: {filename}")
+
+def _dir_usage(directory):
+    total = 0
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            try:
+                total += os.stat(os.path.join(root, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+def disk_usage():
+    """Bytes used per managed directory"""
+    return {d: _dir_usage(d) for d in MANAGED_DIRS if os.path.isdir(d)}
+
+def _last_used(stat):
+    return max(stat.st_atime, stat.st_mtime)
+
+def consumed_story_groups(uploaded):
+    """
+    Cleaned-story groups whose short has been uploaded.
+    Returns (last_used, size, base_name, paths) tuples, least recently used first.
+    """
+    if not os.path.isdir(CLEANED_STORIES_DIR):
+        return []
+    groups = {}
+    for filename in os.listdir(CLEANED_STORIES_DIR):
+        for suffix in CLEANED_SUFFIXES:
+            if filename.endswith(suffix):
+                groups.setdefault(filename[:-len(suffix)], []).append(os.path.join(CLEANED_STORIES_DIR, filename))
+
+    consumed = []
+    for base_name, paths in groups.items():
+        if f"{base_name}_short.mp4" not in uploaded:
+            continue
+        stats = [os.stat(p) for p in paths]
+        consumed.append((max(_last_used(s) for s in stats), sum(s.st_size for s in stats), base_name, paths))
+    return sorted(consumed)
+
+def collect_stale_temp(dry_run=False):
+    """Delete scratch files older than TEMP_MAX_AGE_HOURS; returns bytes freed"""
+    cutoff = time.time() - TEMP_MAX_AGE_HOURS * 3600
+    freed = 0
+    for directory in TEMP_DIRS:
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            if stat.st_mtime >= cutoff:
+                continue
+            print(f"Stale temp file: {entry.path}")
+            if not dry_run:
+                os.remove(entry.path)
+            freed += stat.st_size
+    return freed
+
+def collect_consumed(quota_bytes, dry_run=False):
+    """
+    Delete the intermediates of uploaded stories, least recently used first,
+    until the managed directories fit quota_bytes. Returns bytes freed.
+    """
+    import upload_scheduler
+    usage = sum(disk_usage().values())
+    collected = {}
+    freed = 0
+    for _, size, base_name, paths in consumed_story_groups(upload_scheduler.load_all_upload_logs()):
+        if usage - freed <= quota_bytes:
+            break
+        print(f"Collecting {base_name} ({size / 2**20:.1f} MB)")
+        if not dry_run:
+            for path in paths:
+                os.remove(path)
+            collected[base_name] = {"collected": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "bytes": size}
+        freed += size
+    if collected:
+        save_ledger(collected)
+    return freed
+
+def pack_cold_stories(min_age_days=STORY_ARCHIVE_AGE_DAYS, dry_run=False):
+    """
+    Move story text that ttsbot has consumed and nobody touched for min_age_days
+    into STORY_ARCHIVE. read_story_text() still finds it. Returns bytes moved.
+    """
+    if not os.path.isdir(STORIES_DIR):
+        return 0
+    cutoff = time.time() - min_age_days * 86400
+    cold = []
+    for entry in os.scandir(STORIES_DIR):
+        if not entry.name.endswith('.txt') or not entry.is_file():
+            continue
+        base_name = os.path.splitext(entry.name)[0]
+        tts_done = all(
+            os.path.exists(os.path.join(CLEANED_STORIES_DIR, f"{base_name}{suffix}")) for suffix in TTS_OUTPUT_SUFFIXES
+        )
+        stat = entry.stat()
+        if (tts_done or is_collected(base_name)) and _last_used(stat) < cutoff:
+            cold.append((entry.path, entry.name, stat.st_size))
+
+    if not cold or dry_run:
+        for _, name, _ in cold:
+            print(f"Cold story: {name}")
+        return sum(size for _, _, size in cold)
+
+    with zipfile.ZipFile(STORY_ARCHIVE, 'a', compression=zipfile.ZIP_DEFLATED) as archive:
+        packed = set(archive.namelist())
+        for path, name, _ in cold:
+            if name not in packed:
+                archive.write(path, name)
+    # Originals go only after the archive was closed with its central directory intact
+    for path, _, _ in cold:
+        os.remove(path)
+    print(f"Packed {len(cold)} stories into {STORY_ARCHIVE}")
+    return sum(size for _, _, size in cold)
+
+def collect_garbage(quota_mb=STORAGE_QUOTA_MB, pack=True, dry_run=False):
+    """Run every collection pass; returns bytes freed from the managed directories"""
+    freed = collect_stale_temp(dry_run)
+
+    import generatevideo
+    if os.path.isdir(generatevideo.BACKGROUND_CACHE_DIR) and not dry_run:
+        generatevideo.evict_background_cache()
+
+    if pack:
+        pack_cold_stories(dry_run=dry_run)  # Shrinks stories/ but the bytes move into the archive
+    freed += collect_consumed(quota_mb * 1024 * 1024, dry_run)
+
+    if not dry_run:
+        # Forget collected files in the caches, which are rewritten whole on every update
+        import mediacache
+        if os.path.exists(mediacache.MEDIA_CACHE_FILE):
+            mediacache.save_media_cache()
+        if os.path.exists(generatevideo.RENDER_MANIFEST_FILE):
+            generatevideo.save_render_manifest(generatevideo.load_render_manifest())
+
+    metrics.inc("storage_bytes_freed_total", freed)
+    for directory, size in disk_usage().items():
+        metrics.set_gauge("storage_usage_bytes", size, dir=directory)
+    return freed
+
+def print_usage(quota_mb=STORAGE_QUOTA_MB):
+    usage = disk_usage()
+    for directory, size in usage.items():
+        print(f"{directory:<20}{size / 2**20:>10.1f} MB")
+    print(f"{'total':<20}{sum(usage.values()) / 2**20:>10.1f} MB (quota {quota_mb} MB)")
+    print(f"{len(load_ledger())} stories collected so far")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Garbage-collect consumed pipeline artifacts under a disk quota")
+    parser.add_argument("--quota-mb", type=int, default=STORAGE_QUOTA_MB,
+                        help="Collect uploaded stories' intermediates LRU until usage fits (0 = all of them)")
+    parser.add_argument("--no-pack", action="store_true", help="Leave cold story text uncompressed")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+    parser.add_argument("--usage", action="store_true", help="Print disk usage and exit")
+    parser.add_argument("--channels", default=None,
+                        help="Channel definitions whose upload logs mark stories as consumed (default BOT_CHANNELS_FILE or channels.json)")
+    args = parser.parse_args(argv)
+
+    if args.channels:
+        import upload_scheduler
+        upload_scheduler.use_channels_file(args.channels)
+
+    if args.usage:
+        print_usage(args.quota_mb)
+        return 0
+
+    freed = collect_garbage(args.quota_mb, pack=not args.no_pack, dry_run=args.dry_run)
+    verb = "Would free" if args.dry_run else "Freed"
+    print(f"\n{verb} {freed / 2**20:.1f} MB")
+    print_usage(args.quota_mb)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(metrics.run_main(main, "storage"))
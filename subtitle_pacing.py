@@ -0,0 +1,256 @@
+import os
+import re
+import sys
+import json
+import argparse
+
+import numpy as np  # pip install numpy
+
+import metrics
+
+# Corpus-wide subtitle pacing analysis and re-timing:
+#   python subtitle_pacing.py --report-only     -> display time, gap and words/s distributions
+#   python subtitle_pacing.py                   -> also writes <base>_paced.srt next to every <base>_subs.srt
+# generatevideo renders from <base>_paced.srt when it exists, one event per block.
+# All stories are loaded into flat columnar arrays (one row per word) so the
+# statistics and the grouping run as array operations over the whole corpus.
+
+# Config
+CLEANED_STORIES_DIR = "cleaned_stories"
+SUBS_SUFFIX = "_subs.srt"
+PACED_SUFFIX = "_paced.srt"
+MIN_DISPLAY_SECONDS = 0.45  # No subtitle event shorter than this, unless speech pauses or the story ends
+MAX_WORDS_PER_EVENT = 3
+MAX_EVENT_GAP = 0.35  # Never group across a pause longer than this (matches STYLE_CONFIG["max_event_gap"])
+MAX_READING_WPS = 3.0  # Comfortable subtitle reading speed; faster stories are flagged
+PERCENTILES = [5, 25, 50, 75, 95]
+
+SRT_BLOCK_RE = re.compile(
+    r"(\d+):(\d\d):(\d\d),(\d{3})\s*-->\s*(\d+):(\d\d):(\d\d),(\d{3})[^\n]*\n(.*?)(?:\n[ \t]*\n|\Z)",
+    re.S
+)
+_STORY_STRIDE = 1e6  # Seconds between stories in the combined sort key; far above any story length
+
+class WordCorpus:
+    """
+    Word timings of many stories as parallel arrays, ordered by story then time.
+    story[i] indexes names; start/end are seconds; text is a plain list.
+    """
+    def __init__(self, names, story, start, end, text):
+        self.names = names
+        self.story = story
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def __len__(self):
+        return len(self.text)
+
+    def story_bounds(self):
+        """(first, stop) word index of every story"""
+        first = np.flatnonzero(np.r_[True, self.story[1:] != self.story[:-1]])
+        return first, np.r_[first[1:], len(self)]
+
+def load_corpus(paths):
+    """Parse SRT files into one WordCorpus; files without any block are skipped"""
+    names, story_ids, times, text = [], [], [], []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            blocks = SRT_BLOCK_RE.findall(f.read().replace('\r\n', '\n'))
+        if not blocks:
+            continue
+        story_ids.append(np.full(len(blocks), len(names), dtype=np.int32))
+        names.append(path)
+        times.extend(block[:8] for block in blocks)
+        text.extend(' '.join(block[8].split()) for block in blocks)
+
+    if not names:
+        empty = np.zeros(0)
+        return WordCorpus([], np.zeros(0, dtype=np.int32), empty, empty, [])
+
+    t = np.array(times, dtype=np.int64)
+    start = t[:, 0] * 3600 + t[:, 1] * 60 + t[:, 2] + t[:, 3] / 1000.0
+    end = t[:, 4] * 3600 + t[:, 5] * 60 + t[:, 6] + t[:, 7] / 1000.0
+    story = np.concatenate(story_ids)
+
+    # Keep each story in time order; ttsbot writes them sorted, so this is normally a no-op
+    order = np.lexsort((start, story))
+    return WordCorpus(names, story[order], start[order], end[order], [text[i] for i in order])
+
+def _distribution(values):
+    values = values[~np.isnan(values)]
+    if not values.size:
+        return {}
+    result = {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+    result["mean"] = float(values.mean())
+    return result
+
+def analyze(corpus, min_display=MIN_DISPLAY_SECONDS):
+    """
+    Per-word speech duration, pause after each word, on-screen time with one
+    word per event, and per-story words per second, for the whole corpus at once.
+    """
+    n = len(corpus)
+    first, stop = corpus.story_bounds()
+    same_story = np.r_[corpus.story[1:] == corpus.story[:-1], False]
+
+    duration = corpus.end - corpus.start
+    next_start = np.r_[corpus.start[1:], np.nan]
+    gap = np.where(same_story, next_start - corpus.end, np.nan)
+    # A single-word event is shown until the next word starts; the last word for its own duration
+    display = np.where(same_story, next_start - corpus.start, duration)
+
+    words = stop - first
+    span = np.maximum(corpus.end[stop - 1] - corpus.start[first], 1e-3)
+    wps = words / span
+
+    return {
+        "stories": len(corpus.names),
+        "words": n,
+        "word_duration": _distribution(duration),
+        "gap": _distribution(gap),
+        "display": _distribution(display),
+        "words_per_second": _distribution(wps),
+        "short_display_fraction": float((display < min_display).mean()) if n else 0.0,
+        "fast_stories": [corpus.names[i] for i in np.flatnonzero(wps > MAX_READING_WPS)],
+    }
+
+def group_events(corpus, min_display=MIN_DISPLAY_SECONDS, max_words=MAX_WORDS_PER_EVENT, max_gap=MAX_EVENT_GAP):
+    """
+    Greedy minimum-display-time grouping for every story at once.
+    From each event's first word the next event starts at the first word at
+    least min_display later, capped at max_words words and at the next pause
+    longer than max_gap. Returns the index of the first word of every event.
+    """
+    n = len(corpus)
+    if not n:
+        return np.zeros(0, dtype=np.int64)
+    index = np.arange(n)
+    first, _ = corpus.story_bounds()
+
+    # Segments: story starts and words after a long pause always begin a new event
+    pause_before = np.r_[False, corpus.start[1:] - corpus.end[:-1] > max_gap]
+    segment_start = np.zeros(n, dtype=bool)
+    segment_start[first] = True
+    segment_start |= pause_before
+    segment_starts = np.r_[np.flatnonzero(segment_start), n]
+    next_segment = segment_starts[np.searchsorted(segment_starts, index, side='right')]
+
+    # Where the event starting at each word would end, for every word
+    key = corpus.story * _STORY_STRIDE + corpus.start
+    next_event = np.searchsorted(key, key + min_display, side='left')
+    next_event = np.minimum(np.minimum(next_event, index + max_words), next_segment)
+    next_event = np.maximum(next_event, index + 1)  # min_display 0 would otherwise point a word at itself
+
+    # Follow the chains from each segment start in lockstep; one step per event position
+    is_first = np.zeros(n, dtype=bool)
+    position = np.flatnonzero(segment_start)
+    while position.size:
+        is_first[position] = True
+        position = next_event[position]
+        position = position[position < n]
+        position = position[~is_first[position]]
+    return np.flatnonzero(is_first)
+
+def event_table(corpus, event_first, min_display=MIN_DISPLAY_SECONDS):
+    """(story, start, end, text) columns for grouped events"""
+    event_stop = np.r_[event_first[1:], len(corpus)]
+    story = corpus.story[event_first]
+    start = corpus.start[event_first]
+    end = np.maximum(corpus.end[event_stop - 1], start + min_display)
+    # Never overlap the next event of the same story
+    same_story = np.r_[story[1:] == story[:-1], False]
+    next_start = np.r_[start[1:], np.inf]
+    end = np.where(same_story, np.minimum(end, next_start), end)
+    text = [' '.join(corpus.text[a:b]) for a, b in zip(event_first, event_stop)]
+    return story, start, end, text
+
+def _srt_times(seconds):
+    millis = np.round(seconds * 1000).astype(np.int64)
+    hours, millis = np.divmod(millis, 3600000)
+    minutes, millis = np.divmod(millis, 60000)
+    secs, millis = np.divmod(millis, 1000)
+    return [f"{h:02d}:{m:02d}:{s:02d},{ms:03d}" for h, m, s, ms in zip(hours, minutes, secs, millis)]
+
+def write_paced_srts(corpus, story, start, end, text):
+    """Write one <base>_paced.srt per story; returns the paths written"""
+    start_times, end_times = _srt_times(start), _srt_times(end)
+    bounds = np.r_[np.flatnonzero(np.r_[True, story[1:] != story[:-1]]), len(story)]
+    written = []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        subs_path = corpus.names[story[a]]
+        paced_path = subs_path[:-len(SUBS_SUFFIX)] + PACED_SUFFIX
+        blocks = [
+            f"{i}\n{start_times[j]} --> {end_times[j]}\n{text[j]}\n\n"
+            for i, j in enumerate(range(a, b), start=1)
+        ]
+        temp_path = f"{paced_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.writelines(blocks)
+        os.replace(temp_path, paced_path)
+        written.append(paced_path)
+    return written
+
+def find_subtitle_files(directory=CLEANED_STORIES_DIR, stale_only=True):
+    """ttsbot subtitle files, by default only those without an up-to-date paced copy"""
+    paths = []
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(SUBS_SUFFIX):
+            continue
+        paced_path = entry.path[:-len(SUBS_SUFFIX)] + PACED_SUFFIX
+        if stale_only and os.path.exists(paced_path) and os.path.getmtime(paced_path) >= entry.stat().st_mtime:
+            continue
+        paths.append(entry.path)
+    return sorted(paths)
+
+def print_report(title, stats, min_display, unit="words"):
+    print(f"\n{title}: {stats['stories']} stories, {stats['words']} {unit}")
+    for key in ("word_duration", "gap", "display", "words_per_second"):
+        values = stats[key]
+        if values:
+            row = "  ".join(f"{name} {value:.3f}" for name, value in values.items())
+            print(f"  {key:<17}{row}")
+    print(f"  shown < {min_display}s: {stats['short_display_fraction']:.1%} of {unit}")
+    print(f"  stories above {MAX_READING_WPS} words/s: {len(stats['fast_stories'])}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze subtitle pacing across all stories and write paced SRTs")
+    parser.add_argument("--dir", default=CLEANED_STORIES_DIR)
+    parser.add_argument("--report-only", action="store_true", help="Only print the statistics")
+    parser.add_argument("--all", action="store_true", help="Re-time stories that already have an up-to-date paced SRT")
+    parser.add_argument("--min-display", type=float, default=MIN_DISPLAY_SECONDS)
+    parser.add_argument("--max-words", type=int, default=MAX_WORDS_PER_EVENT)
+    parser.add_argument("--json", default=None, help="Write the statistics to this file")
+    args = parser.parse_args(argv)
+
+    with metrics.timer("subtitle_pacing", step="load"):
+        corpus = load_corpus(find_subtitle_files(args.dir, stale_only=not (args.all or args.report_only)))
+    if not len(corpus):
+        print("No subtitle files to process")
+        return 0
+
+    with metrics.timer("subtitle_pacing", step="analyze"):
+        stats = {"words": analyze(corpus, args.min_display)}
+    print_report("Word timings (one word per event)", stats["words"], args.min_display)
+
+    if not args.report_only:
+        with metrics.timer("subtitle_pacing", step="group"):
+            story, start, end, text = event_table(
+                corpus, group_events(corpus, args.min_display, args.max_words), args.min_display
+            )
+        events = WordCorpus(corpus.names, story, start, end, text)
+        stats["events"] = analyze(events, args.min_display)
+        print_report(f"Paced events (min {args.min_display}s, max {args.max_words} words)", stats["events"], args.min_display, "events")
+
+        with metrics.timer("subtitle_pacing", step="write"):
+            written = write_paced_srts(corpus, story, start, end, text)
+        metrics.inc("subtitle_paced_files_total", len(written))
+        print(f"\nWrote {len(written)} paced subtitle files")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=1)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(metrics.run_main(main, "subtitle_pacing"))
@@ -0,0 +1,186 @@
+import os
+import sys
+import types
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+# Keep metrics and traces out of the working tree
+os.environ.setdefault("BOT_METRICS_DIR", tempfile.mkdtemp(prefix="test_metrics_"))
+
+import upload_stub
+import youtubeupload
+
+CHUNK_SIZE = 256 * 1024
+BODY = {'snippet': {'title': 'Test video'}, 'status': {'privacyStatus': 'private'}}
+
+class CrashAfter(Exception):
+    """Stands in for the uploader process dying"""
+
+class ResumableUploadTest(unittest.TestCase):
+    """youtubeupload.resumable_upload against the local stub endpoint"""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.video_path = os.path.join(self.work_dir.name, "video_short.mp4")
+        self.data = os.urandom(4 * CHUNK_SIZE + 123)
+        with open(self.video_path, 'wb') as f:
+            f.write(self.data)
+
+        patches = [
+            mock.patch.object(youtubeupload, 'UPLOAD_SESSIONS_FILE',
+                              os.path.join(self.work_dir.name, 'upload_sessions.json')),
+            mock.patch.object(youtubeupload, 'UPLOAD_BACKOFF_BASE', 0.001),
+            mock.patch.object(youtubeupload, 'UPLOAD_MAX_RETRIES', 20),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(self.work_dir.cleanup)
+
+    def start_server(self, **options):
+        server = upload_stub.start_stub_server(seed=1, **options)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def upload(self, server):
+        endpoint = server.endpoint if server else 'http://127.0.0.1:9/upload'
+        return youtubeupload.resumable_upload(None, self.video_path, BODY, endpoint, CHUNK_SIZE)
+
+    def assertUploaded(self, response, server):
+        self.assertEqual(response['size'], len(self.data))
+        self.assertEqual(response['sha256'], hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(server.completed[response['id']]['snippet']['title'], 'Test video')
+        self.assertEqual(youtubeupload.load_upload_sessions(), {})
+
+    def test_clean_upload(self):
+        server = self.start_server()
+        response = self.upload(server)
+        self.assertUploaded(response, server)
+        self.assertEqual(server.stats['sessions'], 1)
+        self.assertEqual(server.stats['chunks'], 5)
+        self.assertEqual(server.stats['failures'], 0)
+
+    def test_503_with_partial_commit(self):
+        server = self.start_server(fail_rate=0.4, partial_commit=True)
+        response = self.upload(server)
+        self.assertUploaded(response, server)
+        self.assertGreater(server.stats['failures'], 0)
+        self.assertEqual(server.stats['sessions'], 1)
+
+    def test_dropped_connections(self):
+        server = self.start_server(drop_rate=0.4)
+        response = self.upload(server)
+        self.assertUploaded(response, server)
+        self.assertGreater(server.stats['drops'], 0)
+        self.assertEqual(server.stats['sessions'], 1)
+
+    def crash_partway(self, server, saves=3):
+        """Run an upload that dies after the session was saved `saves` times"""
+        save = youtubeupload.save_upload_session
+        calls = []
+
+        def crashing_save(video_path, session):
+            save(video_path, session)
+            calls.append(session)
+            if len(calls) == saves:
+                raise CrashAfter()
+
+        with mock.patch.object(youtubeupload, 'save_upload_session', crashing_save):
+            with self.assertRaises(CrashAfter):
+                self.upload(server)
+        session = youtubeupload.load_upload_sessions()[os.path.abspath(self.video_path)]
+        self.assertGreater(session['offset'], 0)
+        self.assertLess(session['offset'], len(self.data))
+        return session
+
+    def test_resume_after_crash(self):
+        server = self.start_server(fail_rate=0.2)
+        self.crash_partway(server)
+        response = self.upload(server)
+        self.assertUploaded(response, server)
+        self.assertEqual(server.stats['sessions'], 1)
+        self.assertGreater(server.stats['status_queries'], 0)
+
+    def test_expired_session_starts_new_one(self):
+        server = self.start_server()
+        session = self.crash_partway(server)
+        session_id = session['session_uri'].rsplit('/', 1)[1]
+        del server.sessions[session_id]  # Server forgot it: 404 on the next request
+
+        response = self.upload(server)
+        self.assertUploaded(response, server)
+        self.assertEqual(server.stats['sessions'], 2)
+
+    def test_file_replaced_during_upload(self):
+        server = self.start_server()
+        save = youtubeupload.save_upload_session
+        replacement = os.path.join(self.work_dir.name, "rerender.mp4")
+        with open(replacement, 'wb') as f:
+            f.write(os.urandom(len(self.data)))
+
+        def replacing_save(video_path, session):
+            save(video_path, session)
+            if session and session['offset'] == CHUNK_SIZE:
+                os.replace(replacement, self.video_path)  # A re-render lands mid-upload
+
+        with mock.patch.object(youtubeupload, 'save_upload_session', replacing_save):
+            response = self.upload(server)
+        self.assertUploaded(response, server)
+
+    def test_308_without_progress_gives_up(self):
+        def no_progress(method, url, headers, body=b''):
+            if method == 'POST':
+                return 200, {'Location': 'http://127.0.0.1:9/upload/stuck'}, b''
+            return 308, {}, b''  # Never confirms a byte
+
+        with mock.patch.object(youtubeupload, '_http_request', no_progress), \
+                mock.patch.object(youtubeupload, 'UPLOAD_MAX_RETRIES', 3):
+            with self.assertRaises(youtubeupload.UploadHTTPError) as raised:
+                self.upload(None)
+        self.assertEqual(raised.exception.status, 308)
+
+class ExpiredCreds:
+    """google.oauth2 Credentials whose access token has expired"""
+    valid = False
+    refresh_token = 'refresh'
+    token = 'stale'
+
+    def __init__(self):
+        self.requests = []
+
+    def refresh(self, request):
+        self.requests.append(request)
+        self.valid, self.token = True, 'fresh'
+
+class AuthHeadersTest(unittest.TestCase):
+    """_auth_headers imports google's Request lazily; this runs that path"""
+
+    def test_expired_credentials_are_refreshed(self):
+        try:
+            import google.auth.transport.requests  # noqa: F401
+            modules = {}
+        except ModuleNotFoundError:
+            # Only the import inside _auth_headers is under test, not google-auth itself
+            requests_module = types.ModuleType('google.auth.transport.requests')
+            requests_module.Request = type('Request', (), {})
+            modules = {
+                'google': types.ModuleType('google'),
+                'google.auth': types.ModuleType('google.auth'),
+                'google.auth.transport': types.ModuleType('google.auth.transport'),
+                'google.auth.transport.requests': requests_module,
+            }
+
+        creds = ExpiredCreds()
+        with mock.patch.dict(sys.modules, modules):
+            headers = youtubeupload._auth_headers(creds)
+        self.assertEqual(headers, {'Authorization': 'Bearer fresh'})
+        self.assertEqual(len(creds.requests), 1)
+
+    def test_no_credentials(self):
+        self.assertEqual(youtubeupload._auth_headers(None), {})
+
+if __name__ == "__main__":
+    unittest.main()
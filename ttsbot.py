@@ -1,15 +1,11 @@
 import os
 import csv
 import re
-import edge_tts
-import asyncio
 from pathlib import Path
-from openai import OpenAI  # New import style
-from dotenv import load_dotenv
+import metrics
+import storage
 
-# --- Load OpenAI API Key Securely ---
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))  # New client initialization
+client = None  # OpenAI client, built by get_client() on first use
 
 # --- CONFIG ---
 INPUT_DIR = "stories"
@@ -32,25 +28,37 @@ SWEAR_REPLACEMENTS = {
     "fucking": "messing up",
 }
 
+def get_client():
+    """Create the OpenAI client on first use, loading the API key from .env"""
+    global client
+    if client is None:
+        from openai import OpenAI
+        from dotenv import load_dotenv
+        load_dotenv()
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return client
+
 def censor_text(text):
     """Replace swear words with YouTube-friendly synonyms, with improved fallback."""
     try:
         try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{
-                    "role": "user",
-                    "content": (
-                        f"Make this YouTube-friendly by replacing swear words with natural synonyms. "
-                        f"Keep the tone and meaning intact. Return ONLY the cleaned text:\n\n{text}"
-                    )
-                }],
-                temperature=0.3,
-                max_tokens=1000,
-            )
+            with metrics.timer("openai_request", op="censor"):
+                response = get_client().chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[{
+                        "role": "user",
+                        "content": (
+                            f"Make this YouTube-friendly by replacing swear words with natural synonyms. "
+                            f"Keep the tone and meaning intact. Return ONLY the cleaned text:\n\n{text}"
+                        )
+                    }],
+                    temperature=0.3,
+                    max_tokens=1000,
+                )
             return response.choices[0].message.content
         except Exception as e:
             print(f"GPT-3.5 API failed: {e}")
+            metrics.inc("openai_fallbacks_total", op="censor")
             raise  # Re-raise to trigger the fallback
             
     except Exception:
@@ -85,20 +93,22 @@ def clean_text(text):
     
     try:
         try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{
-                    "role": "user",
-                    "content": (
-                        f"Clean this for a YouTube Short (fix grammar, make concise, keep engaging). "
-                        f"Return ONLY the cleaned text:\n\n{text}"
-                    )
-                }],
-                max_tokens=1000,
-            )
+            with metrics.timer("openai_request", op="clean"):
+                response = get_client().chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[{
+                        "role": "user",
+                        "content": (
+                            f"Clean this for a YouTube Short (fix grammar, make concise, keep engaging). "
+                            f"Return ONLY the cleaned text:\n\n{text}"
+                        )
+                    }],
+                    max_tokens=1000,
+                )
             return response.choices[0].message.content
         except Exception as e:
             print(f"GPT-3.5 API failed: {e}")
+            metrics.inc("openai_fallbacks_total", op="clean")
             raise
             
     except Exception:
@@ -118,14 +128,16 @@ def clean_text(text):
         return text
 async def generate_tts_and_subs(text, output_path):
     """Generate TTS audio and synchronized subtitles using Edge."""
+    import edge_tts
     communicate = edge_tts.Communicate(text, VOICE, rate=TTS_RATE)
     
     subs = []
     
-    with open(output_path, "wb") as audio_file:
+    with metrics.timer("edge_tts"), open(output_path, "wb") as audio_file:
         async for chunk in communicate.stream():
             if chunk["type"] == "audio":
                 audio_file.write(chunk["data"])
+                metrics.inc("tts_audio_bytes_total", len(chunk["data"]))
             elif chunk["type"] == "WordBoundary":
                 # Convert from 100-nanosecond units to seconds
                 start = chunk["offset"] / 10_000_000
@@ -158,46 +170,55 @@ def save_srt(subs, output_path):
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(subs)
 
-def main():
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+def process_story(row):
+    """Clean one index row's story and generate its TTS and subtitles; returns the cleaned index row"""
+    filename, title, upvotes, comments, subreddit, _, _, _, _, url, _, _, _ = row
+    input_path = os.path.join(INPUT_DIR, filename)
 
-    with open(INDEX_FILE, mode="r", encoding="utf-8") as f:
-        reader = csv.reader(f, delimiter="|")
-        rows = list(reader)
+    base_name = Path(filename).stem
+    cleaned_text_path = os.path.join(OUTPUT_DIR, f"{base_name}_cleaned.txt")
+    tts_path = os.path.join(OUTPUT_DIR, f"{base_name}_tts.mp3")
+    subtitle_path = os.path.join(OUTPUT_DIR, f"{base_name}_subs.srt")
 
-    cleaned_rows = [rows[0] + ["cleaned_text_path", "tts_path", "subtitle_path"]]
+    if all(os.path.exists(p) for p in [cleaned_text_path, tts_path, subtitle_path]):
+        print(f"Skipping {filename} (already processed)")
+        metrics.inc("tts_skipped_total")
+        return row + [cleaned_text_path, tts_path, subtitle_path]
+    if storage.is_collected(base_name):
+        print(f"Skipping {filename} (uploaded, intermediates collected)")
+        metrics.inc("tts_skipped_total")
+        return row + [cleaned_text_path, tts_path, subtitle_path]
 
-    for row in rows[1:]:
-        filename, title, upvotes, comments, subreddit, _, _, _, _, url, _, _, _ = row
-        input_path = os.path.join(INPUT_DIR, filename)
+    raw_text = storage.read_story_text(filename, INPUT_DIR)  # May come from the cold story archive
 
-        base_name = Path(filename).stem
-        cleaned_text_path = os.path.join(OUTPUT_DIR, f"{base_name}_cleaned.txt")
-        tts_path = os.path.join(OUTPUT_DIR, f"{base_name}_tts.mp3")
-        subtitle_path = os.path.join(OUTPUT_DIR, f"{base_name}_subs.srt")
+    cleaned_text = clean_text(raw_text)
 
-        if all(os.path.exists(p) for p in [cleaned_text_path, tts_path, subtitle_path]):
-            print(f"Skipping {filename} (already processed)")
-            cleaned_rows.append(row + [cleaned_text_path, tts_path, subtitle_path])
-            continue
+    with open(cleaned_text_path, "w", encoding="utf-8") as f:
+        f.write(cleaned_text)
 
-        with open(input_path, "r", encoding="utf-8") as f:
-            raw_text = f.read()
+    print(f"Generating TTS and subtitles for {filename}...")
+    import asyncio  # Only needed once there is TTS work; keeps the import cheap
+    subs = asyncio.run(generate_tts_and_subs(cleaned_text, tts_path))
+    save_srt(subs, subtitle_path)
 
-        cleaned_text = clean_text(raw_text)
+    metrics.inc("tts_stories_total")
+    return row + [cleaned_text_path, tts_path, subtitle_path]
 
-        with open(cleaned_text_path, "w", encoding="utf-8") as f:
-            f.write(cleaned_text)
+def main():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    with open(INDEX_FILE, mode="r", encoding="utf-8") as f:
+        reader = csv.reader(f, delimiter="|")
+        rows = list(reader)
 
-        print(f"Generating TTS and subtitles for {filename}...")
-        subs = asyncio.run(generate_tts_and_subs(cleaned_text, tts_path))
-        save_srt(subs, subtitle_path)
+    cleaned_rows = [rows[0] + ["cleaned_text_path", "tts_path", "subtitle_path"]]
 
-        cleaned_rows.append(row + [cleaned_text_path, tts_path, subtitle_path])
+    for row in rows[1:]:
+        cleaned_rows.append(process_story(row))
 
     with open(CLEANED_INDEX, "w", encoding="utf-8", newline="") as f:
         writer = csv.writer(f, delimiter="|")
         writer.writerows(cleaned_rows)
 
 if __name__ == "__main__":
-    main()
+    metrics.run_main(main, "ttsbot")
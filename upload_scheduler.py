@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import heapq
+import random
+import argparse
+import itertools
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import youtubeupload
+
+# Config
+CHANNELS_FILE = os.getenv("BOT_CHANNELS_FILE", "channels.json")  # --channels overrides it for the whole process
+VIDEO_SUFFIX = '_short.mp4'
+
+# Example channels.json:
+# [
+#   {"name": "main", "videos_folder": "videos", "client_secrets": "client_secrets.json",
+#    "token_file": "token.json", "upload_log": "uploaded_videos.log",
+#    "upload_times": ["0759", "1559", "2359"], "random_minute_variation": 30, "daily_quota": 3},
+#   {"name": "second", "videos_folder": "videos_second", ...}
+# ]
+
+def load_channel_configs(path=None):
+    """Channel definitions, or a single channel from youtubeupload's settings if there is no file"""
+    path = path or CHANNELS_FILE
+    defaults = {
+        "videos_folder": youtubeupload.VIDEOS_FOLDER,
+        "client_secrets": youtubeupload.CLIENT_SECRETS_FILE,
+        "token_file": "token.json",
+        "upload_log": youtubeupload.UPLOAD_LOG_FILE,
+        "upload_times": youtubeupload.UPLOAD_TIMES,
+        "random_minute_variation": youtubeupload.RANDOM_MINUTE_VARIATION,
+        "daily_quota": None,
+    }
+    if not os.path.exists(path):
+        return [dict(defaults, name="default")]
+
+    with open(path, 'r') as f:
+        configs = json.load(f)
+    return [dict(defaults, **config) for config in configs]
+
+class VideoQueue:
+    """
+    Pending videos for one folder, kept in memory.
+    The folder is scanned once; after that videos arrive through add().
+    Channels that share a folder share the queue, so a video is claimed once.
+    """
+    def __init__(self, folder, uploaded):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.in_flight = set()
+        self.uploaded = uploaded
+        self.rescan()
+
+    def rescan(self):
+        os.makedirs(self.folder, exist_ok=True)
+        with self.lock:
+            for entry in os.scandir(self.folder):
+                if entry.name.endswith(VIDEO_SUFFIX) and entry.name not in self.uploaded:
+                    if entry.name not in self.in_flight:
+                        self.pending.add(entry.name)
+
+    def add(self, video_name):
+        """Returns True if the video was new to the queue"""
+        with self.lock:
+            if video_name in self.uploaded or video_name in self.in_flight or video_name in self.pending:
+                return False
+            self.pending.add(video_name)
+            return True
+
+    def claim(self):
+        with self.lock:
+            if not self.pending:
+                return None
+            video_name = random.choice(sorted(self.pending))
+            self.pending.discard(video_name)
+            self.in_flight.add(video_name)
+            return video_name
+
+    def finish(self, video_name, uploaded):
+        with self.lock:
+            self.in_flight.discard(video_name)
+            if uploaded:
+                self.uploaded.add(video_name)
+            elif os.path.exists(os.path.join(self.folder, video_name)):
+                self.pending.add(video_name)  # Retry at the next slot
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+class Channel:
+    def __init__(self, config, queue):
+        self.name = config["name"]
+        self.config = config
+        self.queue = queue
+        self.creds = None
+        self.quota_date = None
+        self.uploads_today = 0
+        self.starved = False  # A slot found nothing to upload; the next new video goes out at once
+        self.busy = False
+        self.slot_id = None
+
+    def quota_left(self):
+        today = datetime.now().date()
+        if self.quota_date != today:
+            self.quota_date, self.uploads_today = today, 0
+        quota = self.config.get("daily_quota")
+        return quota is None or self.uploads_today < quota
+
+    def next_slot(self):
+        return youtubeupload.get_next_upload_time(
+            self.config["upload_times"], self.config["random_minute_variation"]
+        )
+
+def _load_upload_log(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r') as f:
+        return set(line.strip() for line in f if line.strip())
+
+def use_channels_file(path):
+    """
+    Point every reader in this process at path: the scheduler, and the upload-log
+    checks in generatevideo, storage and bot.py --plan that call load_all_upload_logs()
+    """
+    global CHANNELS_FILE
+    CHANNELS_FILE = path
+
+def load_all_upload_logs(path=None):
+    """Uploaded video names across every channel's upload log"""
+    uploaded = set()
+    for config in load_channel_configs(path):
+        uploaded |= _load_upload_log(config["upload_log"])
+    return uploaded
+
+class UploadScheduler:
+    """
+    Runs the upload slots of several channels from one process.
+    Slots live on a timer heap; the loop sleeps until the earliest slot or
+    until a new video is announced, and uploads for different channels run
+    concurrently on a thread pool.
+    """
+    def __init__(self, channel_configs, initial_upload=True):
+        self.condition = threading.Condition()
+        self.heap = []
+        self.sequence = itertools.count()
+        self.stopping = False
+        self.initial_upload = initial_upload
+
+        queues = {}
+        self.channels = []
+        for config in channel_configs:
+            folder = os.path.abspath(config["videos_folder"])
+            uploaded = _load_upload_log(config["upload_log"])
+            if folder not in queues:
+                queues[folder] = VideoQueue(folder, uploaded)
+            else:
+                queues[folder].uploaded |= uploaded  # Channels sharing a folder keep separate logs
+            self.channels.append(Channel(config, queues[folder]))
+        self.queues = queues
+        self.executor = ThreadPoolExecutor(max_workers=len(self.channels), thread_name_prefix="upload")
+
+    def authenticate(self):
+        """Sequential, since a missing token opens an interactive OAuth flow"""
+        for channel in self.channels:
+            print(f"[{channel.name}] Authenticating")
+            channel.creds = youtubeupload.get_credentials(
+                channel.config["client_secrets"], channel.config["token_file"]
+            )
+
+    def _schedule(self, channel, when):
+        """Each channel has one live slot; scheduling again supersedes the older heap entry"""
+        channel.slot_id = next(self.sequence)
+        heapq.heappush(self.heap, (when, channel.slot_id, channel))
+        print(f"[{channel.name}] Next upload scheduled for: {when}")
+
+    def notify_new_video(self, video_path):
+        """Announce a finished video (from the file watcher or the pipeline)"""
+        folder = os.path.abspath(os.path.dirname(video_path))
+        queue = self.queues.get(folder)
+        video_name = os.path.basename(video_path)
+        if queue is None or not video_name.endswith(VIDEO_SUFFIX) or not queue.add(video_name):
+            return
+        print(f"Queued {video_name} ({len(queue)} pending in {folder})")
+        metrics.set_gauge("scheduler_pending_videos", len(queue), folder=folder)
+        with self.condition:
+            for channel in self.channels:
+                if channel.queue is queue and channel.starved and not channel.busy:
+                    channel.starved = False  # Make up the slot that found nothing to upload
+                    self._schedule(channel, datetime.now())
+            self.condition.notify()
+
+    def _upload(self, channel):
+        video_name = channel.queue.claim()
+        if video_name is None:
+            channel.queue.rescan()  # Only happens when the queue ran dry, e.g. without watchdog
+            video_name = channel.queue.claim()
+        if video_name is None:
+            print(f"[{channel.name}] No videos left to upload!")
+            channel.starved = True
+            return
+
+        video_path = os.path.join(channel.queue.folder, video_name)
+        title = youtubeupload.extract_title(video_name)
+        print(f"[{channel.name}] Uploading {video_name} with title: {title}")
+        uploaded = False
+        try:
+            youtubeupload.upload_video(channel.creds, video_path, title)
+            youtubeupload.log_uploaded_video(video_name, channel.config["upload_log"])
+            channel.uploads_today += 1
+            uploaded = True
+            metrics.inc("scheduler_uploads_total", channel=channel.name)
+        except Exception as e:
+            print(f"[{channel.name}] Failed to upload {video_name}: {str(e)}")
+        finally:
+            channel.queue.finish(video_name, uploaded)
+
+    def _run_slot(self, channel):
+        try:
+            if channel.quota_left():
+                self._upload(channel)
+            else:
+                print(f"[{channel.name}] Daily quota reached, skipping slot")
+        finally:
+            with self.condition:
+                channel.busy = False
+                self._schedule(channel, channel.next_slot())
+                self.condition.notify()
+
+    def _dispatch(self, channel):
+        channel.busy = True
+        self.executor.submit(self._run_slot, channel)
+
+    def run(self):
+        with self.condition:
+            for channel in self.channels:
+                if self.initial_upload:
+                    self._schedule(channel, datetime.now())
+                else:
+                    self._schedule(channel, channel.next_slot())
+
+            while not self.stopping:
+                now = datetime.now()
+                while self.heap and self.heap[0][0] <= now:
+                    _, slot_id, channel = heapq.heappop(self.heap)
+                    if slot_id != channel.slot_id or channel.busy:
+                        continue  # Superseded, or the running upload reschedules the channel when it finishes
+                    self._dispatch(channel)
+
+                timeout = (self.heap[0][0] - now).total_seconds() if self.heap else None
+                self.condition.wait(timeout)
+
+        self.executor.shutdown(wait=True)
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+
+def start_file_watcher(scheduler):
+    """Wake the scheduler on new videos via watchdog when it is installed"""
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        print("watchdog not installed; new videos are picked up at startup or via notify_new_video")
+        return None
+
+    class NewVideoHandler(FileSystemEventHandler):
+        # generatevideo os.replace()s finished shorts in from videos/temp; with a
+        # non-recursive watch that move arrives as a created event
+        def on_created(self, event):
+            if not event.is_directory and event.src_path.endswith(VIDEO_SUFFIX):
+                scheduler.notify_new_video(event.src_path)
+
+        def on_moved(self, event):
+            scheduler.notify_new_video(event.dest_path)
+
+        def on_closed(self, event):
+            scheduler.notify_new_video(event.src_path)
+
+    observer = Observer()
+    for folder in scheduler.queues:
+        observer.schedule(NewVideoHandler(), folder, recursive=False)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upload scheduler for one or more YouTube channels")
+    parser.add_argument("--channels", default=CHANNELS_FILE, help="Channel definitions (JSON); also BOT_CHANNELS_FILE")
+    parser.add_argument("--no-initial-upload", action="store_true", help="Wait for the first slot instead of uploading at startup")
+    args = parser.parse_args(argv)
+    use_channels_file(args.channels)
+
+    scheduler = UploadScheduler(load_channel_configs(args.channels), initial_upload=not args.no_initial_upload)
+    scheduler.authenticate()
+    for folder, queue in scheduler.queues.items():
+        print(f"{len(queue)} videos pending in {folder}")
+
+    observer = start_file_watcher(scheduler)
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        print("\nStopping scheduler, waiting for running uploads...")
+        scheduler.stop()
+        scheduler.executor.shutdown(wait=True)
+    finally:
+        if observer:
+            observer.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(metrics.run_main(main, "upload_scheduler"))
@@ -0,0 +1,182 @@
+import re
+import sys
+import json
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stand-in for the YouTube resumable upload endpoint, for exercising
+# youtubeupload.resumable_upload offline:
+#   python upload_stub.py --port 8765 --fail-rate 0.2
+#   YOUTUBE_UPLOAD_ENDPOINT=http://127.0.0.1:8765/upload/youtube/v3/videos python youtubeupload.py
+
+UPLOAD_PATH = "/upload/youtube/v3/videos"
+SESSION_PATH = "/upload/session/"
+CONTENT_RANGE_RE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+)")
+
+class UploadSession:
+    def __init__(self, session_id, total_size, metadata):
+        self.session_id = session_id
+        self.total_size = total_size
+        self.metadata = metadata
+        self.data = bytearray()
+        self.video_id = None
+
+class StubUploadServer(ThreadingHTTPServer):
+    """
+    Speaks the resumable upload protocol and injects failures.
+    fail_rate: chance of answering a chunk PUT with 503
+    partial_commit: on an injected failure, keep part of the chunk anyway,
+        so clients must query the confirmed offset instead of assuming it
+    drop_rate: chance of closing the connection without any response
+    """
+    daemon_threads = True
+
+    def __init__(self, address, fail_rate=0.0, partial_commit=True, drop_rate=0.0, seed=None):
+        super().__init__(address, StubUploadHandler)
+        self.fail_rate = fail_rate
+        self.partial_commit = partial_commit
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.sessions = {}
+        self.completed = {}
+        self.stats = {"sessions": 0, "chunks": 0, "status_queries": 0, "failures": 0, "drops": 0, "bytes": 0}
+        self.lock = threading.Lock()
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{UPLOAD_PATH}"
+
+class StubUploadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None, headers=None):
+        content = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        if content:
+            self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _incomplete(self, session):
+        headers = {"Range": f"bytes=0-{len(session.data) - 1}"} if session.data else {}
+        self._reply(308, headers=headers)
+
+    def do_POST(self):
+        if not self.path.startswith(UPLOAD_PATH) or "uploadType=resumable" not in self.path:
+            self._reply(404, {"error": "unknown upload path"})
+            return
+        metadata = json.loads(self._read_body() or b'{}')
+        server = self.server
+        with server.lock:
+            server.stats["sessions"] += 1
+            session_id = f"s{server.stats['sessions']}"
+            server.sessions[session_id] = UploadSession(
+                session_id, int(self.headers["X-Upload-Content-Length"]), metadata
+            )
+        host, port = server.server_address[:2]
+        self._reply(200, headers={"Location": f"http://{host}:{port}{SESSION_PATH}{session_id}"})
+
+    def do_PUT(self):
+        server = self.server
+        session = server.sessions.get(self.path[len(SESSION_PATH):]) if self.path.startswith(SESSION_PATH) else None
+        body = self._read_body()
+        if session is None:
+            self._reply(404, {"error": "no such session"})
+            return
+
+        match = CONTENT_RANGE_RE.fullmatch(self.headers.get("Content-Range", ""))
+        if not match:
+            self._reply(400, {"error": "bad Content-Range"})
+            return
+
+        if session.video_id:
+            self._reply(200, server.completed[session.video_id])
+            return
+
+        with server.lock:
+            if match.group(1) is None:
+                server.stats["status_queries"] += 1
+                self._incomplete(session)
+                return
+
+            server.stats["chunks"] += 1
+            start, end = int(match.group(1)), int(match.group(2))
+            if start != len(session.data) or end - start + 1 != len(body):
+                self._reply(400, {"error": f"expected chunk at {len(session.data)}"})
+                return
+
+            roll = server.random.random()
+            if roll < server.drop_rate:
+                server.stats["drops"] += 1
+                self.close_connection = True
+                self.connection.close()
+                return
+            if roll < server.drop_rate + server.fail_rate:
+                server.stats["failures"] += 1
+                if server.partial_commit:
+                    kept = (len(body) // 2) // (256 * 1024) * (256 * 1024)
+                    session.data.extend(body[:kept])
+                    server.stats["bytes"] += kept
+                self._reply(503, {"error": "injected failure"})
+                return
+
+            session.data.extend(body)
+            server.stats["bytes"] += len(body)
+            if len(session.data) < session.total_size:
+                self._incomplete(session)
+                return
+
+            session.video_id = f"stub-{session.session_id}"
+            server.completed[session.video_id] = {
+                "id": session.video_id,
+                "snippet": session.metadata.get("snippet", {}),
+                "sha256": hashlib.sha256(session.data).hexdigest(),
+                "size": len(session.data),
+            }
+        self._reply(201, server.completed[session.video_id])
+
+def start_stub_server(port=0, **options):
+    """Run a stub server on a background thread; returns the server (see .endpoint)"""
+    server = StubUploadServer(("127.0.0.1", port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the YouTube resumable upload endpoint")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Chance of a 503 per chunk")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Chance of dropping the connection per chunk")
+    parser.add_argument("--no-partial-commit", action="store_true", help="Discard the whole chunk on injected failures")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    server = StubUploadServer(
+        ("127.0.0.1", args.port),
+        fail_rate=args.fail_rate,
+        partial_commit=not args.no_partial_commit,
+        drop_rate=args.drop_rate,
+        seed=args.seed
+    )
+    print(f"Stub upload endpoint: {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{server.stats}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
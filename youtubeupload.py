@@ -2,12 +2,11 @@ import os
 import random
 import json
 import time
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode
 from datetime import datetime, timedelta
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google.auth.transport.requests import Request  # Added this import
+import metrics
 
 # Configuration
 VIDEOS_FOLDER = 'videos'
@@ -15,29 +14,48 @@ UPLOAD_LOG_FILE = 'uploaded_videos.log'
 CLIENT_SECRETS_FILE = 'client_secrets.json'
 SCOPES = ['https://www.googleapis.com/auth/youtube.upload']
 
+# Resumable uploads
+UPLOAD_ENDPOINT = os.getenv('YOUTUBE_UPLOAD_ENDPOINT', 'https://www.googleapis.com/upload/youtube/v3/videos')
+UPLOAD_SESSIONS_FILE = 'upload_sessions.json'
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Must be a multiple of 256 KiB
+UPLOAD_MAX_RETRIES = 8  # Consecutive failures without progress before giving up
+UPLOAD_BACKOFF_BASE = 1.0  # Seconds, doubled per retry
+UPLOAD_BACKOFF_MAX = 64.0
+UPLOAD_TIMEOUT = 120
+
 # Upload times (HHMM format)
 UPLOAD_TIMES = ['0759', '1559', '2359']
 RANDOM_MINUTE_VARIATION = 30  # +/- minutes variation
 
-def get_authenticated_service():
+def get_credentials(client_secrets_file=CLIENT_SECRETS_FILE, token_file='token.json'):
+    # Google client libraries are imported here: they are slow to import and
+    # nothing else in this module needs them
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
     creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+    if os.path.exists(token_file):
+        creds = Credentials.from_authorized_user_file(token_file, SCOPES)
     
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
             flow = InstalledAppFlow.from_client_secrets_file(
-                CLIENT_SECRETS_FILE, 
+                client_secrets_file, 
                 SCOPES
             )
             creds = flow.run_local_server(port=8080)  # Fixed port
         
-        with open('token.json', 'w') as token:
+        with open(token_file, 'w') as token:
             token.write(creds.to_json())
     
-    return build('youtube', 'v3', credentials=creds)
+    return creds
+
+def get_authenticated_service():
+    from googleapiclient.discovery import build
+    return build('youtube', 'v3', credentials=get_credentials())
     
 def get_uploadable_videos():
     """Get list of videos that haven't been uploaded yet"""
@@ -49,9 +67,9 @@ def get_uploadable_videos():
     all_videos = [f for f in os.listdir(VIDEOS_FOLDER) if f.endswith('_short.mp4')]
     return [v for v in all_videos if v not in uploaded_videos]
 
-def log_uploaded_video(video_name):
+def log_uploaded_video(video_name, log_file=UPLOAD_LOG_FILE):
     """Mark a video as uploaded in the log file"""
-    with open(UPLOAD_LOG_FILE, 'a') as f:
+    with open(log_file, 'a') as f:
         f.write(f"{video_name}\n")
 
 def extract_title(video_name):
@@ -61,7 +79,213 @@ def extract_title(video_name):
     # Remove _short.mp4 suffix
     return no_date.replace('_short.mp4', '')
     
-def upload_video(youtube, video_path, title):
+_sessions_lock = threading.Lock()
+
+class UploadHTTPError(Exception):
+    """Unexpected HTTP status from the upload endpoint"""
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+class UploadSessionExpired(Exception):
+    """The server no longer knows the resumable session; start a new one"""
+
+def load_upload_sessions():
+    """Persisted resumable sessions, keyed by absolute video path"""
+    if not os.path.exists(UPLOAD_SESSIONS_FILE):
+        return {}
+    try:
+        with open(UPLOAD_SESSIONS_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_upload_session(video_path, session):
+    """Record (or with session=None, forget) the resumable session for a video"""
+    with _sessions_lock:  # Uploads for several channels may run concurrently
+        sessions = load_upload_sessions()
+        key = os.path.abspath(video_path)
+        if session is None:
+            sessions.pop(key, None)
+        else:
+            sessions[key] = session
+
+        temp_path = f"{UPLOAD_SESSIONS_FILE}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(sessions, f, indent=1)
+        os.replace(temp_path, UPLOAD_SESSIONS_FILE)
+
+def _auth_headers(creds):
+    if creds is None:
+        return {}
+    if not creds.valid and creds.refresh_token:
+        from google.auth.transport.requests import Request  # Access tokens expire after about an hour
+        creds.refresh(Request())
+    return {'Authorization': f'Bearer {creds.token}'}
+
+def _http_request(method, url, headers, body=b''):
+    """Single HTTP request without redirect handling (308 is part of the upload protocol)"""
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    connection = connection_class(parts.netloc, timeout=UPLOAD_TIMEOUT)
+    path = parts.path + (f"?{parts.query}" if parts.query else '')
+    try:
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        connection.close()
+
+def _parse_confirmed_offset(headers):
+    """Bytes the server has persisted, from a 308 Range header ('bytes=0-N')"""
+    byte_range = headers.get('Range')
+    if not byte_range:
+        return 0
+    return int(byte_range.rsplit('-', 1)[1]) + 1
+
+def _check_upload_response(status, headers, content):
+    """Returns ('done', response), ('incomplete', offset), or raises for the caller to handle"""
+    if status in (200, 201):
+        return 'done', json.loads(content)
+    if status == 308:
+        return 'incomplete', _parse_confirmed_offset(headers)
+    if status in (404, 410):
+        raise UploadSessionExpired(f"Upload session gone (HTTP {status})")
+    raise UploadHTTPError(status, content[:200])
+
+def start_upload_session(creds, total_size, body, endpoint=UPLOAD_ENDPOINT):
+    """Open a resumable upload session for total_size bytes and return its URI"""
+    query = urlencode({'uploadType': 'resumable', 'part': ','.join(body.keys())})
+    headers = {
+        'Content-Type': 'application/json; charset=UTF-8',
+        'X-Upload-Content-Length': str(total_size),
+        'X-Upload-Content-Type': 'video/mp4',
+        **_auth_headers(creds),
+    }
+    with metrics.timer("upload_session_start"):
+        status, response_headers, content = _http_request(
+            'POST', f"{endpoint}?{query}", headers, json.dumps(body).encode('utf-8')
+        )
+    if status != 200 or not response_headers.get('Location'):
+        raise UploadHTTPError(status, f"could not start upload session: {content[:200]!r}")
+    return response_headers['Location']
+
+def query_upload_status(creds, session_uri, total_size):
+    """Ask the server how much of the upload it has confirmed"""
+    headers = {'Content-Length': '0', 'Content-Range': f"bytes */{total_size}", **_auth_headers(creds)}
+    return _check_upload_response(*_http_request('PUT', session_uri, headers))
+
+def upload_chunk(creds, session_uri, video_file, offset, chunk_size, total_size):
+    """Send one chunk of the open video_file starting at offset"""
+    video_file.seek(offset)
+    data = video_file.read(chunk_size)
+    headers = {
+        'Content-Length': str(len(data)),
+        'Content-Range': f"bytes {offset}-{offset + len(data) - 1}/{total_size}",
+        **_auth_headers(creds),
+    }
+    with metrics.timer("upload_chunk"):
+        result = _check_upload_response(*_http_request('PUT', session_uri, headers, data))
+    metrics.inc("upload_bytes_total", len(data))
+    return result
+
+def _is_retryable(error):
+    """5xx responses and dropped connections are worth retrying; anything else is not"""
+    if isinstance(error, UploadHTTPError):
+        return error.status >= 500
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+def _backoff(retries, reason):
+    """Sleep before retry number retries + 1"""
+    delay = min(UPLOAD_BACKOFF_MAX, UPLOAD_BACKOFF_BASE * 2 ** retries) * random.uniform(0.5, 1.0)
+    metrics.inc("upload_retries_total")
+    print(f"Upload error ({reason}); retry {retries + 1}/{UPLOAD_MAX_RETRIES} in {delay:.1f}s")
+    time.sleep(delay)
+
+def resumable_upload(creds, video_path, body, endpoint=UPLOAD_ENDPOINT, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Upload a video in chunks through a resumable session.
+    The session URI and confirmed offset are persisted after every chunk, so a
+    restarted uploader continues the same session instead of starting over.
+    5xx responses, connection errors and chunks the server did not take are
+    retried with exponential backoff. The file is read through one handle for
+    the whole session, so a render replacing it midway cannot mix two files
+    into one upload.
+    """
+    if chunk_size % (256 * 1024):
+        raise ValueError("chunk_size must be a multiple of 256 KiB")
+
+    with open(video_path, 'rb') as video_file:
+        return _resumable_upload(creds, video_path, video_file, body, endpoint, chunk_size)
+
+def _resumable_upload(creds, video_path, video_file, body, endpoint, chunk_size):
+    stat = os.fstat(video_file.fileno())
+    total_size = stat.st_size
+    session = load_upload_sessions().get(os.path.abspath(video_path))
+    if session and (session.get('size') != total_size or session.get('mtime_ns') != stat.st_mtime_ns):
+        session = None  # File changed since the session was opened
+
+    offset = None
+    if session:
+        print(f"Resuming upload session from byte {session['offset']}")
+        needs_status_query = True
+    else:
+        needs_status_query = False
+
+    retries = 0
+    while True:
+        try:
+            if session is None:
+                session = {
+                    'session_uri': start_upload_session(creds, total_size, body, endpoint),
+                    'size': total_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'offset': 0,
+                    'chunk_size': chunk_size,
+                    'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                }
+                save_upload_session(video_path, session)
+                offset = 0
+
+            sent_chunk = not needs_status_query
+            if needs_status_query:
+                state, result = query_upload_status(creds, session['session_uri'], total_size)
+                needs_status_query = False
+            else:
+                state, result = upload_chunk(
+                    creds, session['session_uri'], video_file, offset, chunk_size, total_size
+                )
+        except UploadSessionExpired as e:
+            print(f"{e}; starting a new session")
+            save_upload_session(video_path, None)
+            session, needs_status_query = None, False
+            continue
+        except Exception as e:
+            if not _is_retryable(e) or retries >= UPLOAD_MAX_RETRIES:
+                raise
+            _backoff(retries, e)
+            retries += 1
+            needs_status_query = session is not None  # The server may have kept part of the chunk
+            continue
+
+        if state == 'done':
+            save_upload_session(video_path, None)
+            return result
+
+        if offset is None or result > offset:
+            retries = 0
+        elif sent_chunk:
+            # 308 without progress: the chunk was not taken, so back off like any other failure
+            if retries >= UPLOAD_MAX_RETRIES:
+                raise UploadHTTPError(308, f"no progress past byte {offset} after {retries} retries")
+            _backoff(retries, f"chunk at byte {offset} not accepted")
+            retries += 1
+        offset = result
+        session['offset'] = offset
+        save_upload_session(video_path, session)
+        print(f"Uploaded {int(offset * 100 / total_size)}%")
+
+def upload_video(creds, video_path, title):
     """Upload video to YouTube with custom description"""
     # Navier-Stokes equations in convective form
     navier_stokes_eq = """
@@ -99,22 +323,17 @@ Where:
     }
     
     try:
-        media = MediaFileUpload(video_path, chunksize=-1, resumable=True)
-        request = youtube.videos().insert(
-            part=','.join(body.keys()),
-            body=body,
-            media_body=media
-        )
-        
-        response = None
-        while response is None:
-            status, response = request.next_chunk()
-            if status:
-                print(f"Uploaded {int(status.progress() * 100)}%")
-        
+        uploaded_stat = os.stat(video_path)
+        with metrics.timer("upload_video"):
+            response = resumable_upload(creds, video_path, body)
         print(f"Video uploaded! ID: {response['id']}")
+        metrics.inc("uploads_total")
         
-        # Only delete if upload was successful
+        # Only delete if upload was successful, and not a newer render that replaced the file meanwhile
+        current_stat = os.stat(video_path)
+        if (current_stat.st_ino, current_stat.st_mtime_ns) != (uploaded_stat.st_ino, uploaded_stat.st_mtime_ns):
+            print(f"Kept local file, replaced during upload: {video_path}")
+            return response
         os.remove(video_path)
         print(f"Deleted local file: {video_path}")
         
@@ -124,14 +343,14 @@ Where:
         print(f"Error during upload or file deletion: {str(e)}")
         raise  # Re-raise the exception to handle it in the calling function
 
-def get_next_upload_time():
+def get_next_upload_time(upload_times=UPLOAD_TIMES, variation_minutes=RANDOM_MINUTE_VARIATION):
     """Calculate next upload time with random variation"""
     now = datetime.now()
     
     # Find the next upload time today
-    for upload_time in UPLOAD_TIMES:
+    for upload_time in upload_times:
         target = datetime.strptime(f"{now.strftime('%Y%m%d')} {upload_time}", '%Y%m%d %H%M')
-        variation = random.randint(-RANDOM_MINUTE_VARIATION, RANDOM_MINUTE_VARIATION)
+        variation = random.randint(-variation_minutes, variation_minutes)
         target += timedelta(minutes=variation)
         
         if target > now:
@@ -139,12 +358,12 @@ def get_next_upload_time():
     
     # If all today's upload times have passed, use first time tomorrow
     tomorrow = now + timedelta(days=1)
-    target = datetime.strptime(f"{tomorrow.strftime('%Y%m%d')} {UPLOAD_TIMES[0]}", '%Y%m%d %H%M')
-    variation = random.randint(-RANDOM_MINUTE_VARIATION, RANDOM_MINUTE_VARIATION)
+    target = datetime.strptime(f"{tomorrow.strftime('%Y%m%d')} {upload_times[0]}", '%Y%m%d %H%M')
+    variation = random.randint(-variation_minutes, variation_minutes)
     return target + timedelta(minutes=variation)
 
 def main():
-    youtube = get_authenticated_service()
+    creds = get_credentials()
     
     # Initial upload
     uploadable_videos = get_uploadable_videos()
@@ -154,7 +373,7 @@ def main():
         title = extract_title(video_to_upload)
         print(f"Uploading {video_to_upload} with title: {title}")
         try:
-            upload_video(youtube, video_path, title)
+            upload_video(creds, video_path, title)
             log_uploaded_video(video_to_upload)
         except Exception as e:
             print(f"Failed to upload {video_to_upload}: {str(e)}")
@@ -177,7 +396,7 @@ def main():
             title = extract_title(video_to_upload)
             print(f"Uploading {video_to_upload} with title: {title}")
             try:
-                upload_video(youtube, video_path, title)
+                upload_video(creds, video_path, title)
                 log_uploaded_video(video_to_upload)
             except Exception as e:
                 print(f"Failed to upload {video_to_upload}: {str(e)}")
@@ -185,4 +404,4 @@ def main():
             print("No videos left to upload!")
             
 if __name__ == '__main__':
-    main()
+    metrics.run_main(main, "youtubeupload")